@@ -1,90 +1,165 @@
-from flask import Flask, render_template, request, jsonify
-import requests, datetime, random
-import netCDF4 as nc
-import numpy as np
-from groq import Groq
-import os
+from flask import Flask, Response, g, render_template, request, jsonify
+import json, os, threading, time
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Groq client
-groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+import metrics
 
-app = Flask(__name__)
+# numpy, netCDF4, groq and the provider stack are imported by the routes that
+# use them, so a cold start serving /, /about or a static file never loads them.
+# Provider fetchers read their tokens at import, which is after the .env above.
+STATIC_ENDPOINTS = {"index", "alerts", "about", "share_with_us", "static", "metrics_endpoint"}
+
+# Created on first use by groq(); tests may assign a stand-in
+groq_client = None
 
-EARTHDATA_TOKEN = os.getenv("EARTHDATA_TOKEN")
+app = Flask(__name__)
 
-# 🔹 Helper: classify AQI
+_workers_started = False
+_workers_lock = threading.Lock()
+
+
+def groq():
+    global groq_client
+    if groq_client is None:
+        from groq import Groq
+        groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    return groq_client
+
+
+def start_workers():
+    """Load the data stack and start its background threads, once per process."""
+    global _workers_started
+    if _workers_started:
+        return
+    with _workers_lock:
+        if _workers_started:
+            return
+        import grid_store
+        from forecast import forecaster
+        from prefetch import prefetcher
+        from providers import fetch_region
+        from stations import catalog
+
+        # Keep the day's GPCP/TEMPO grids on local disk so lookups skip the network
+        if os.getenv("GRID_REFRESH", "0") == "1":
+            grid_store.start_refresher()
+
+        # Refetch provider data for the most requested cells before it expires
+        if os.getenv("PREFETCH", "1") == "1":
+            prefetcher.start()
+
+        # Re-pull every active region's OpenAQ stations in bulk so ground lookups stay local
+        if os.getenv("STATION_REFRESH", "1") == "1":
+            catalog.start(fetch_region)
+
+        # Refit the AQI forecast from the history store now and nightly
+        if os.getenv("FORECAST_REFIT", "1") == "1":
+            forecaster.start()
+
+        metrics.collector(cache_and_provider_gauges)
+        _workers_started = True
+
+# 🔹 Per-request timing: stage spans, fallbacks and cache hits, logged as one JSON line
+@app.before_request
+def start_request_metrics():
+    if request.endpoint and request.endpoint not in STATIC_ENDPOINTS:
+        start_workers()
+    if request.path != "/metrics":
+        g.metrics_token = metrics.start_request()
+
+@app.after_request
+def record_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if request.path == "/metrics":
+        return
+    if g.get("metrics_streamed"):
+        # streamed_response() finishes the record once the body is sent
+        metrics.reset_request(g.get("metrics_token"))
+        return
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.finish_request(request.method, route, request.path, g.get("metrics_status", 500),
+                           g.get("metrics_token"))
+
+def streamed_response(body, **kwargs):
+    """Response for a generator body whose request is logged after the last
+    chunk, so the Groq and batch spans timed while streaming are in it."""
+    response = Response(body, **kwargs)
+    method, route, path = request.method, request.url_rule.rule, request.path
+    response.response = metrics.streamed(
+        response.response, lambda: metrics.finish_request(method, route, path, response.status_code))
+    g.metrics_streamed = True
+    return response
+
+def cache_and_provider_gauges():
+    # Registered by start_workers(), once these modules are loaded
+    from cache import provider_cache
+    from forecast import forecaster
+    from heatmap import tile_stats
+    from history import history
+    from http_client import CLIENTS
+    from llm_cache import answer_cache
+    from prefetch import prefetcher
+    from snapshot import snapshot_stats
+    from stations import catalog
+
+    caches = {"provider": provider_cache.stats(), "snapshot": snapshot_stats(), "answer": answer_cache.stats(),
+              "tile": tile_stats()}
+    samples = [(f"igun_cache_{key}", {"cache": name}, value)
+               for name, stats in caches.items() for key, value in stats.items()]
+    samples += [(f"igun_prefetch_{key}", {}, value) for key, value in prefetcher.stats().items()]
+    samples += [(f"igun_history_{key}", {}, value) for key, value in history.stats().items()]
+    samples += [(f"igun_forecast_{key}", {}, value) for key, value in forecaster.stats().items()]
+    samples += [(f"igun_stations_{key}", {}, value) for key, value in catalog.stats().items()]
+    samples += [("igun_circuit_open", {"provider": name}, int(c.state() == "open")) for name, c in CLIENTS.items()]
+    return samples
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# 🔹 Helper: classify AQI (scalar wrappers over the vectorized engine in aqi.py)
 def classify_aqi(aqi):
-    if aqi <= 50: return "Good"
-    elif aqi <= 100: return "Moderate"
-    elif aqi <= 150: return "Unhealthy for Sensitive Groups"
-    elif aqi <= 200: return "Unhealthy"
-    elif aqi <= 300: return "Very Unhealthy"
-    else: return "Hazardous"
-
-# 🔹 Helper: reverse geocode (lat → city name)
-def get_city_name(lat, lon):
-    try:
-        url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lon}"
-        r = requests.get(url, headers={"User-Agent": "IGUN-Air-App"})
-        if r.status_code == 200:
-            data = r.json()
-            city = data.get("address", {}).get("city") or \
-                   data.get("address", {}).get("town") or \
-                   data.get("address", {}).get("village") or \
-                   data.get("address", {}).get("county")
-            country = data.get("address", {}).get("country")
-            return f"{city}, {country}" if city else country or "Unknown"
-    except Exception as e:
-        print("Geocoding error:", e)
-    return "Unknown Location"
+    from aqi import CATEGORIES, category_codes
+    return CATEGORIES[int(category_codes(aqi))]
 
+def compute_aqi_pm25(value):
+    from aqi import compute_aqi
+    return int(compute_aqi("pm25", value))
 
-# 🔹 to ensure ground reading is live
-def get_ground_data(lat, lon):
-    url = f"https://api.openaq.org/v2/latest?coordinates={lat},{lon}&radius=50000&parameter=pm25&limit=5&order_by=distance"
-    try:
-        r = requests.get(url, timeout=10)
-        if r.status_code == 200:
-            res = r.json()
-            if res["results"]:
-                nearest = res["results"][0]  # pick the closest station
-                pm25_value = nearest["measurements"][0]["value"]
-                station = nearest.get("location")
-                return {"pm25": round(pm25_value, 2), "station": station}
-    except Exception as e:
-        print("OpenAQ error:", e)
-    return {"pm25": round(random.uniform(5, 50), 2), "station": "Fallback"}
 
+FORECAST_COLORS = ("text-success", "text-warning")  # Good, Moderate; worse is text-danger
 
-def compute_aqi_pm25(value):
-    breakpoints = [
-        (0.0, 12.0, 0, 50),
-        (12.1, 35.4, 51, 100),
-        (35.5, 55.4, 101, 150),
-        (55.5, 150.4, 151, 200),
-        (150.5, 250.4, 201, 300),
-        (250.5, 500.4, 301, 500),
-    ]
-    for (Clow, Chigh, Ilow, Ihigh) in breakpoints:
-        if Clow <= value <= Chigh:
-            return round(((Ihigh - Ilow)/(Chigh - Clow))*(value - Clow) + Ilow)
-    return 500
+
+def forecast_days(lat, lon, aqi, weather_data, ahead):
+    from aqi import CATEGORIES, category_codes
+    from forecast import forecaster
+
+    with metrics.timed("forecast"):
+        days = forecaster.daily(lat, lon, aqi, weather_data, ahead)
+    result = []
+    for start_hour, value in days:
+        code = int(category_codes(value))
+        result.append({
+            "day": time.strftime("%a", time.gmtime(start_hour * 3600)),
+            "aqi": value,
+            "status": CATEGORIES[code],
+            "colorClass": FORECAST_COLORS[code] if code < len(FORECAST_COLORS) else "text-danger",
+        })
+    return result
 
 
 def health_advisory(classification):
-    advices = {
-        "Good": "Air quality is satisfactory. Enjoy outdoor activities.",
-        "Moderate": "Air quality is acceptable, but unusually sensitive individuals may feel effects.",
-        "Unhealthy for Sensitive Groups": "Limit outdoor exertion if you have respiratory issues.",
-        "Unhealthy": "Everyone may begin to feel effects. Reduce outdoor activity.",
-        "Very Unhealthy": "Health alert: everyone may experience serious effects. Stay indoors.",
-        "Hazardous": "Emergency conditions. Avoid all outdoor exposure."
-    }
-    return advices.get(classification, "No advisory available.")
+    from aqi import ADVISORIES, CATEGORIES
+    if classification not in CATEGORIES:
+        return "No advisory available."
+    return ADVISORIES[CATEGORIES.index(classification)]
 
 @app.route('/')
 def index():
@@ -106,218 +181,55 @@ def share_with_us():
 def dashboard():
     lat = request.args.get("lat")
     lon = request.args.get("lon")
-
-    # ✅ Lookup city name automatically
-    city = get_city_name(lat, lon)
-
-    now = datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
-
-    # --- NASA TEMPO Enhanced Integration ---
-    tempo_data = {}
-    no2_value = 0
-    try:
-        # Alternative NASA TEMPO approach using GES DISC
-        # This provides better NO2 data access
-        url = f"https://disc.gsfc.nasa.gov/api/data/TEMPO_NO2_L3_V03/{lat}/{lon}"
-        headers = {
-            "Authorization": f"Bearer {EARTHDATA_TOKEN}",
-            "User-Agent": "IGUN-Air-App"
-        }
-        r = requests.get(url, headers=headers, timeout=10)
-        
-        if r.status_code == 200:
-            try:
-                tempo_data = r.json()
-                no2_value = tempo_data.get("NO2_column", random.uniform(15, 40))
-            except:
-                # If JSON parsing fails, estimate based on location
-                pass
-        else:
-            print("TEMPO API unavailable, using estimated NO2 data")
-            
-    except Exception as e:
-        print("TEMPO error:", str(e))
-    
-    # Generate realistic NO2 data based on location type
-    if not tempo_data or not no2_value:
-        lat_f = float(lat)
-        # Urban areas typically have higher NO2
-        if lat_f > 50:  # Northern cities (often more industrial)
-            no2_value = random.uniform(20, 45)
-        elif lat_f > 30:  # Temperate urban areas
-            no2_value = random.uniform(25, 50)
-        else:  # Tropical/developing regions
-            no2_value = random.uniform(15, 35)
-        
-        # Add city-specific factors (this could be enhanced with city detection)
-        city_lower = city.lower()
-        if any(word in city_lower for word in ['tokyo', 'beijing', 'delhi', 'mexico']):
-            no2_value *= 1.5  # Major polluted cities
-        elif any(word in city_lower for word in ['stockholm', 'oslo', 'zurich', 'copenhagen']):
-            no2_value *= 0.7  # Clean Nordic cities
-            
-        no2_value = round(no2_value, 2)
-
-
-    # --- Open-Meteo (current + hourly weather) - Enhanced reliability ---
-    weather_data = {}
-    weather_chart = {"temp": [], "humidity": [], "wind": []}
-    try:
-        # Enhanced weather API call with more parameters for better accuracy
-        url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,wind_speed_10m,weather_code&hourly=temperature_2m,relative_humidity_2m,wind_speed_10m&timezone=auto&forecast_days=1"
-        response = requests.get(url, timeout=15)
-
-        if response.status_code == 200:
-            data = response.json()
-            current = data.get("current", {})
-            weather_data = {
-                "temp": round(current.get("temperature_2m", 25), 1),
-                "humidity": round(current.get("relative_humidity_2m", 60), 1),
-                "wind": round(current.get("wind_speed_10m", 5), 2),
-                "weather_code": current.get("weather_code", 0)
-            }
-            
-            # Get hourly data for the last 5 hours for charts
-            hourly = data.get("hourly", {})
-            if hourly:
-                temp_data = hourly.get("temperature_2m", [])
-                humidity_data = hourly.get("relative_humidity_2m", [])
-                wind_data = hourly.get("wind_speed_10m", [])
-                
-                # Get the most recent 5 hours of data
-                weather_chart["temp"] = [round(v, 1) for v in temp_data[-5:]] if temp_data else [weather_data["temp"]] * 5
-                weather_chart["humidity"] = [round(v, 1) for v in humidity_data[-5:]] if humidity_data else [weather_data["humidity"]] * 5
-                weather_chart["wind"] = [round(v, 1) for v in wind_data[-5:]] if wind_data else [weather_data["wind"]] * 5
-            else:
-                # Fallback to current values
-                weather_chart = {
-                    "temp": [weather_data["temp"]] * 5,
-                    "humidity": [weather_data["humidity"]] * 5,
-                    "wind": [weather_data["wind"]] * 5
-                }
-
-        print(f"Weather data for {str(city).encode('ascii', 'ignore').decode('ascii')}: Temp={weather_data.get('temp')}C, Humidity={weather_data.get('humidity')}%, Wind={weather_data.get('wind')}km/h")
-
-    except Exception as e:
-        print("Open-Meteo API error:", str(e))
-        # Enhanced fallback with more realistic data based on location
-        # Different base temperatures for different regions
-        lat_f = float(lat)
-        if lat_f > 40:  # Northern regions (Europe, Northern Asia)
-            base_temp = round(random.uniform(8, 18), 1)
-        elif lat_f > 23:  # Temperate regions (Most of Asia, US)
-            base_temp = round(random.uniform(15, 25), 1)
-        elif lat_f > 0:  # Tropical regions (Southeast Asia, Central Africa)
-            base_temp = round(random.uniform(24, 35), 1)
-        else:  # Southern hemisphere
-            base_temp = round(random.uniform(10, 22), 1)
-            
-        weather_data = {
-            "temp": base_temp,
-            "humidity": round(random.uniform(40, 80), 1),
-            "wind": round(random.uniform(3, 15), 1),
-            "weather_code": random.randint(0, 3)
-        }
-        weather_chart = {
-            "temp": [round(base_temp + random.uniform(-3, 3), 1) for _ in range(5)],
-            "humidity": [round(weather_data["humidity"] + random.uniform(-15, 15), 1) for _ in range(5)],
-            "wind": [round(weather_data["wind"] + random.uniform(-3, 5), 1) for _ in range(5)]
-        }
-
-
-    # --- NASA IMERG / GPCP (rainfall) ---
-    rainfall = None
-    try:
-        date = datetime.datetime.utcnow().strftime("%Y-%m-%d")
-        url = (
-            "https://gpm1.gesdisc.eosdis.nasa.gov/daac-bin/OTF/HTTP_services.cgi?"
-            f"FILENAME=/data/GPCP/GPCPDAY/3.3/{date[:4]}/gpcp_v03r03_y{date[:4]}m{date[5:7]}d{date[8:10]}.nc4&"
-            "SERVICE=SUBSET_GPCP&VERSION=1.02&"
-            "SHORTNAME=GPCPDAY&"
-            "VARIABLES=precip&"
-            f"LAT={lat}&LON={lon}&"
-            f"token={EARTHDATA_TOKEN}&LABEL=gpcp_subset.nc4"
-        )
-        response = requests.get(url)
-        if response.status_code == 200:
-            with open("gpcp_subset.nc4", "wb") as f:
-                f.write(response.content)
-
-            ds = nc.Dataset("gpcp_subset.nc4", "r")
-            precip = float(ds.variables["precip"][:].data)
-            rainfall = round(precip, 2)
-    except Exception as e:
-        print("IMERG error:", e)
-
-   # --- AQI (from TEMPO NO2 + Ground PM2.5) ---
-    ground_data = get_ground_data(lat, lon)
-    pm25 = ground_data["pm25"]
-    
-    # Use the location-aware NO2 data from TEMPO (calculated above)
-    no2 = no2_value
-    
-    # Calculate AQI primarily from PM2.5, but enhance with TEMPO NO2 data
-    base_aqi = compute_aqi_pm25(pm25)
-    
-    # NASA TEMPO Enhancement: Adjust AQI based on satellite NO2 readings
-    if no2 > 50:  # Very high NO2 from TEMPO satellite
-        aqi = min(base_aqi + 20, 500)
-        print(f"TEMPO Alert: High NO2 detected ({no2} ug/m3) - AQI adjusted +20")
-    elif no2 > 35:  # High NO2 from TEMPO
-        aqi = min(base_aqi + 12, 500)
-        print(f"TEMPO Data: Elevated NO2 ({no2} ug/m3) - AQI adjusted +12")
-    elif no2 > 25:  # Moderate NO2 from TEMPO
-        aqi = min(base_aqi + 5, 500)
-        print(f"TEMPO Data: Moderate NO2 ({no2} ug/m3) - AQI adjusted +5")
-    else:
-        aqi = base_aqi
-        print(f"TEMPO Data: Good NO2 levels ({no2} ug/m3) - No AQI adjustment")
-    
-    aqi = round(aqi)
-    classification = classify_aqi(aqi)
-    advisory = health_advisory(classification)
-
-    # --- Generate realistic time-series charts using TEMPO and ground data ---
-    # TEMPO Chart: Create realistic NO2 variation based on satellite reading
-    tempo_base = no2_value
-    tempo_chart = []
-    for i in range(5):
-        # Simulate daily NO2 pattern based on TEMPO satellite observations
-        hour_factor = [0.8, 1.0, 0.9, 1.2, 0.7][i]  # Rush hour patterns
-        variation = random.uniform(-0.15, 0.15)
-        tempo_reading = round(tempo_base * hour_factor * (1 + variation), 2)
-        tempo_chart.append(max(5, tempo_reading))
-    
-    # Ground Chart: Create realistic PM2.5 variation based on OpenAQ readings
-    ground_base = pm25
-    ground_chart = []
-    for i in range(5):
-        # Simulate daily PM2.5 pattern from ground stations
-        hour_factor = [0.9, 0.8, 1.1, 1.3, 1.0][i]  # Daily pollution cycle
-        variation = random.uniform(-0.2, 0.2)
-        ground_reading = round(ground_base * hour_factor * (1 + variation), 2)
-        ground_chart.append(max(3, ground_reading))
-        
-    print(f"NASA TEMPO Integration: NO2={no2} ug/m3, Ground PM2.5={pm25} ug/m3, Final AQI={aqi}")
+    from history import HISTORY_CHART_HOURS, chart, history
+    from prefetch import prefetcher
+    from snapshot import snapshot_for
+    prefetcher.record(lat, lon)
+
+    # ✅ One snapshot per grid cell: geocoding, TEMPO, Open-Meteo, GPCP and OpenAQ
+    # fetched concurrently, then scored; /chat reuses it by ID
+    snapshot = snapshot_for(lat, lon)
+    city = snapshot["city"]
+    no2_value = snapshot["no2"]
+    pm25 = snapshot["ground"]["pm25"]
+    aqi = snapshot["aqi"]
+    classification = snapshot["classification"]
+    weather_data = snapshot["weather"]
+    rainfall = snapshot["rainfall"]
+
+    # --- Time-series charts from the readings recorded for this grid cell ---
+    past = history.series(lat, lon, hours=HISTORY_CHART_HOURS)
+    tempo_labels, tempo_chart = chart(past, "no2", no2_value)
+    ground_labels, ground_chart = chart(past, "pm25", pm25)
+    weather_labels, temp_chart = chart(past, "temp", weather_data.get("temp", 25))
+    weather_chart = {
+        "labels": weather_labels,
+        "temp": temp_chart,
+        "humidity": chart(past, "humidity", weather_data.get("humidity", 60))[1],
+        "wind": chart(past, "wind", weather_data.get("wind", 5))[1],
+    }
 
     data = {
+        "snapshot_id": snapshot["id"],
         "lat": lat,
         "lon": lon,
         "city": city,
         "aqi": aqi,
         "classification": classification,
-        "advisory": advisory,
+        "advisory": snapshot["advisory"],
 
         # 🔹 NASA TEMPO (satellite data)
         "tempo": {
             "no2": round(no2_value, 2),
-            "source": "NASA TEMPO Satellite" if tempo_data else "TEMPO Estimated"
+            "source": snapshot["tempo_source"]
         },
         "tempo_chart": tempo_chart,
+        "tempo_labels": tempo_labels,
 
         # 🔹 Ground validation (OpenAQ/AirNow – live)
-        "ground": ground_data,
+        "ground": snapshot["ground"],
         "ground_chart": ground_chart,
+        "ground_labels": ground_labels,
 
         # 🔹 Weather (from MERRA-2 + IMERG)
         "weather": {
@@ -329,13 +241,10 @@ def dashboard():
         },
         "weather_chart": weather_chart,
 
-        # 🔹 Forecast (simple fake trend for UI)
-        "forecast": [
-            {"day": "Tue", "aqi": aqi+5, "status": classification, "colorClass": "text-success"},
-            {"day": "Wed", "aqi": aqi+10, "status": classification, "colorClass": "text-warning"},
-            {"day": "Thu", "aqi": aqi-8, "status": classification, "colorClass": "text-danger"},
-            {"day": "Fri", "aqi": aqi+3, "status": classification, "colorClass": "text-warning"}
-        ],
+        # 🔹 Forecast (daily mean AQI from the per-cell model in forecast.py),
+        # anchored on the measured AQI rather than one with an estimated NO2 bump
+        "forecast": forecast_days(lat, lon, aqi if snapshot.get("measured_aqi") is None else snapshot["measured_aqi"],
+                                  weather_data, snapshot["weather_chart"].get("ahead")),
 
         # 🔹 Alerts + Summary
         "alerts": "Real-time air quality from NASA TEMPO, validated by OpenAQ & IMERG.",
@@ -343,82 +252,68 @@ def dashboard():
     }
 
 
-    return render_template("dashboard.html", data=data)
+    with metrics.timed("render"):
+        return render_template("dashboard.html", data=data)
+
+@app.route("/api/aqi", methods=["POST"])
+def api_aqi():
+    # Batch AQI for many sites; streams one NDJSON line per point as cells resolve
+    from batch import parse_points, stream_readings
+    try:
+        points = parse_points(request.get_data(), request.content_type)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    lines = (json.dumps(result) + "\n" for result in stream_readings(points))
+    return streamed_response(lines, mimetype="application/x-ndjson")
+
+# 🔹 AQI heatmap: Web Mercator tiles for map clients, or any bounding box
+@app.route("/tiles/<layer>/<int:z>/<int:x>/<int:y>.<fmt>")
+def aqi_tile(layer, z, x, y, fmt):
+    from heatmap import render_tile, tile_axes
+    try:
+        lats, lons = tile_axes(z, x, y)
+        body, headers = render_tile(("tile", z, x, y), lats, lons, layer, fmt)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return Response(body, headers=headers)
+
+@app.route("/api/aqi/grid")
+def aqi_grid():
+    # ?bbox=south,west,north,east&res=<degrees>&layer=aqi|pm25|no2|rain&format=bin|png
+    from heatmap import bbox_axes, render_tile
+    bbox, res = request.args.get("bbox"), request.args.get("res", "0.01")
+    try:
+        lats, lons = bbox_axes(bbox, res)
+        body, headers = render_tile(("bbox", bbox, res), lats, lons,
+                                    request.args.get("layer", "aqi"), request.args.get("format", "bin"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return Response(body, headers=headers)
 
 @app.route("/chat", methods=["POST"])
 def chat():
+    from formatter import format_llm_response
+    from llm_cache import answer_cache
+    from providers import fallback_weather
+    from snapshot import snapshot_for
     user_question = request.json.get("question", "")
 
-    # 🔹 Get REAL-TIME data for accurate health advice
+    # 🔹 Reuse the dashboard's snapshot (or this grid cell's) for real-time data
     lat = request.args.get("lat", "6.5244")   # fallback Lagos
     lon = request.args.get("lon", "3.3792")
-    
-    # Get the actual city name
-    city = get_city_name(lat, lon)
-
-    # --- Get Real TEMPO Data (same logic as dashboard) ---
-    tempo_data = {}
-    no2_value = 0
-    lat_f = float(lat)
-    if lat_f > 50:  # Northern cities (often more industrial)
-        no2_value = random.uniform(20, 45)
-    elif lat_f > 30:  # Temperate urban areas
-        no2_value = random.uniform(25, 50)
-    else:  # Tropical/developing regions
-        no2_value = random.uniform(15, 35)
-    
-    # Add city-specific factors for accurate TEMPO simulation
-    city_lower = city.lower()
-    if any(word in city_lower for word in ['tokyo', 'beijing', 'delhi', 'mexico', 'mumbai']):
-        no2_value *= 1.5  # Major polluted cities
-    elif any(word in city_lower for word in ['stockholm', 'oslo', 'zurich', 'copenhagen']):
-        no2_value *= 0.7  # Clean Nordic cities
-    no2_value = round(no2_value, 2)
-
-    # --- Get Real Ground Station Data ---
-    ground = get_ground_data(lat, lon)
-    
-    # --- Get Real Weather Data ---
-    weather_data = {}
-    try:
-        url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,wind_speed_10m&timezone=auto"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            current = data.get("current", {})
-            weather_data = {
-                "temp": round(current.get("temperature_2m", 20), 1),
-                "humidity": round(current.get("relative_humidity_2m", 60), 1),
-                "wind": round(current.get("wind_speed_10m", 5), 1),
-                "rainfall": random.uniform(0, 3)  # IMERG rainfall estimate
-            }
-    except:
-        # Location-based fallback
-        if lat_f > 40:  # Northern regions
-            base_temp = random.uniform(8, 18)
-        elif lat_f > 23:  # Temperate regions
-            base_temp = random.uniform(15, 25)
-        else:  # Tropical regions
-            base_temp = random.uniform(24, 35)
-        weather_data = {
-            "temp": round(base_temp, 1),
-            "humidity": round(random.uniform(40, 80), 1),
-            "wind": round(random.uniform(3, 15), 1),
-            "rainfall": round(random.uniform(0, 5), 1)
-        }
-
-    # --- Calculate Real AQI with TEMPO Enhancement ---
-    base_aqi = compute_aqi_pm25(ground["pm25"])
-    if no2_value > 50:
-        aqi = min(base_aqi + 20, 500)
-    elif no2_value > 35:
-        aqi = min(base_aqi + 12, 500)
-    elif no2_value > 25:
-        aqi = min(base_aqi + 5, 500)
-    else:
-        aqi = base_aqi
-    aqi = round(aqi)
-    classification = classify_aqi(aqi)
+    snapshot_id = request.args.get("snapshot") or request.json.get("snapshot")
+    snapshot = snapshot_for(lat, lon, snapshot_id)
+
+    city = snapshot["city"]
+    lat, lon = snapshot["lat"], snapshot["lon"]
+    aqi = snapshot["aqi"]
+    classification = snapshot["classification"]
+    ground = snapshot["ground"]
+    no2_value = snapshot["no2"]
+    weather_data = dict(snapshot["weather"], rainfall=snapshot["rainfall"] or 0)
+    if "temp" not in weather_data:
+        weather_data.update(fallback_weather(lat)[0])
 
     # Enhanced System Context with ALL real data for public health advice
     system_context = f"""
@@ -440,17 +335,15 @@ def chat():
     
     HEALTH CONTEXT:
     - Air Quality Classification: {classification}
-    - Health Advisory: {health_advisory(classification)}
+    - Health Advisory: {snapshot['advisory']}
     
     Please provide specific, actionable health advice based on this real-time data for people in {city}.
     Consider the actual current conditions and their specific health implications.
     """
 
     # 🔹 Ask Groq to answer user naturally with better formatting
-    completion = groq_client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[
-            {"role": "system", "content": system_context + """
+    messages = [
+        {"role": "system", "content": system_context + """
             
             FORMATTING INSTRUCTIONS:
             - Use clear paragraphs with line breaks for readability
@@ -460,41 +353,75 @@ def chat():
             - Keep sentences concise and easy to read
             - Use emojis sparingly but appropriately for health advisories
             """},
-            {"role": "user", "content": user_question},
-        ],
-    )
+        {"role": "user", "content": user_question},
+    ]
+
+    # Streaming mode: formatted tokens as server-sent events while Groq generates
+    streaming = request.args.get("stream") == "1" or request.json.get("stream")
+
+    # Near-identical questions for the same city, AQI band and weather reuse an answer
+    cached_answer = answer_cache.get(user_question, snapshot)
+    if cached_answer is not None:
+        if streaming:
+            return Response([sse({"delta": cached_answer}), sse({}, event="done")], mimetype="text/event-stream")
+        return jsonify({"answer": cached_answer})
+
+    if streaming:
+        on_done = lambda answer: answer_cache.set(user_question, snapshot, answer)
+        return streamed_response(stream_answer(messages, on_done), mimetype="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    with metrics.timed("groq"):
+        completion = groq().chat.completions.create(
+            model="llama-3.1-8b-instant",
+            messages=messages,
+        )
 
     raw_answer = completion.choices[0].message.content
     
     # Post-process the answer for better formatting
     formatted_answer = format_llm_response(raw_answer)
+    answer_cache.set(user_question, snapshot, formatted_answer)
     
     return jsonify({"answer": formatted_answer})
 
 
-def format_llm_response(text):
-    """Format LLM response for better readability in the frontend"""
-    import re
-    
-    # Add proper line breaks after sentences for readability
-    text = re.sub(r'(\. )([A-Z])', r'\1\n\n\2', text)
-    
-    # Ensure bullet points are properly formatted
-    text = re.sub(r'[\-\*]\s*', '• ', text)
-    
-    # Add spacing around numbered lists
-    text = re.sub(r'(\d+\.\s)', r'\n\1', text)
-    
-    # Clean up multiple consecutive line breaks
-    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
-    
-    # Add emphasis formatting for health warnings
-    text = re.sub(r'(IMPORTANT|WARNING|ALERT|CAUTION|URGENT)([:\s])', r'**\1**\2', text, flags=re.IGNORECASE)
-    
-    # Format health recommendations with emphasis
-    text = re.sub(r'(should|must|avoid|recommended|advised)(\s+[^.]+\.)', r'**\1**\2', text, flags=re.IGNORECASE)
-    
-    return text.strip()
+def sse(payload, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+
+def stream_answer(messages, on_done=None):
+    with metrics.timed("groq"):
+        yield from _stream_answer(messages, on_done)
+
+
+def _stream_answer(messages, on_done):
+    from formatter import StreamFormatter
+    formatter = StreamFormatter()
+    parts = []
+    try:
+        stream = groq().chat.completions.create(
+            model="llama-3.1-8b-instant",
+            messages=messages,
+            stream=True,
+        )
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            text = formatter.feed(delta) if delta else ""
+            if text:
+                parts.append(text)
+                yield sse({"delta": text})
+        text = formatter.finish()
+        if text:
+            parts.append(text)
+            yield sse({"delta": text})
+        if on_done and parts:
+            on_done("".join(parts))
+        yield sse({}, event="done")
+    except Exception as e:
+        print("Groq streaming error:", e)
+        yield sse({"error": "Sorry, there was an error processing your request."}, event="error")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,116 @@
+import numpy as np
+
+# Category code → label/advice; code i covers AQI up to CATEGORY_UPPER[i]
+CATEGORIES = (
+    "Good",
+    "Moderate",
+    "Unhealthy for Sensitive Groups",
+    "Unhealthy",
+    "Very Unhealthy",
+    "Hazardous",
+)
+ADVISORIES = (
+    "Air quality is satisfactory. Enjoy outdoor activities.",
+    "Air quality is acceptable, but unusually sensitive individuals may feel effects.",
+    "Limit outdoor exertion if you have respiratory issues.",
+    "Everyone may begin to feel effects. Reduce outdoor activity.",
+    "Health alert: everyone may experience serious effects. Stay indoors.",
+    "Emergency conditions. Avoid all outdoor exposure.",
+)
+CATEGORY_UPPER = np.array([50, 100, 150, 200, 300], dtype=float)
+
+# EPA breakpoints (Clow, Chigh, Ilow, Ihigh)
+# PM2.5 / PM10 in µg/m³ (24-hour), O3 in ppb (8-hour), NO2 in ppb (1-hour)
+BREAKPOINTS = {
+    "pm25": [
+        (0.0, 12.0, 0, 50),
+        (12.1, 35.4, 51, 100),
+        (35.5, 55.4, 101, 150),
+        (55.5, 150.4, 151, 200),
+        (150.5, 250.4, 201, 300),
+        (250.5, 500.4, 301, 500),
+    ],
+    "pm10": [
+        (0, 54, 0, 50),
+        (55, 154, 51, 100),
+        (155, 254, 101, 150),
+        (255, 354, 151, 200),
+        (355, 424, 201, 300),
+        (425, 504, 301, 400),
+        (505, 604, 401, 500),
+    ],
+    "o3": [
+        (0, 54, 0, 50),
+        (55, 70, 51, 100),
+        (71, 85, 101, 150),
+        (86, 105, 151, 200),
+        (106, 200, 201, 300),
+    ],
+    "no2": [
+        (0, 53, 0, 50),
+        (54, 100, 51, 100),
+        (101, 360, 101, 150),
+        (361, 649, 151, 200),
+        (650, 1249, 201, 300),
+        (1250, 1649, 301, 400),
+        (1650, 2049, 401, 500),
+    ],
+}
+
+
+class _Table:
+    def __init__(self, rows):
+        clow, chigh, ilow, ihigh = (np.array(col, dtype=float) for col in zip(*rows))
+        self.clow, self.chigh, self.ilow = clow, chigh, ilow
+        self.slope = (ihigh - ilow) / (chigh - clow)
+        self.top = chigh[-1]
+
+
+_TABLES = {name: _Table(rows) for name, rows in BREAKPOINTS.items()}
+
+
+def compute_aqi(pollutant, concentrations):
+    """AQI for an array of concentrations of one pollutant.
+
+    Returns float64 AQI values rounded like ``round()``; NaN inputs stay NaN.
+    Concentrations falling between two breakpoint rows (e.g. PM2.5 12.05) score
+    as the top of the lower row, negatives score 0 and anything above the
+    table scores 500.
+    """
+    table = _TABLES[pollutant]
+    c = np.asarray(concentrations, dtype=float)
+    idx = np.searchsorted(table.clow, c, side="right") - 1
+    seg = np.clip(idx, 0, len(table.clow) - 1)
+    clipped = np.minimum(c, table.chigh[seg])
+    values = np.round(table.slope[seg] * (clipped - table.clow[seg]) + table.ilow[seg])
+    values = np.where(idx < 0, 0.0, values)
+    return np.where(c > table.top, 500.0, values)
+
+
+def overall_aqi(**pollutants):
+    """Worst per-pollutant AQI, e.g. ``overall_aqi(pm25=..., no2=...)``."""
+    stacked = np.stack(np.broadcast_arrays(*(compute_aqi(name, values) for name, values in pollutants.items())))
+    return np.fmax.reduce(stacked, axis=0)
+
+
+def category_codes(aqi):
+    """Index into CATEGORIES for each AQI value; -1 where AQI is NaN."""
+    aqi = np.asarray(aqi, dtype=float)
+    codes = np.searchsorted(CATEGORY_UPPER, aqi, side="left")
+    return np.where(np.isnan(aqi), -1, codes).astype(np.int8)
+
+
+def category_labels(codes):
+    return np.take(np.array(CATEGORIES + ("Unknown",), dtype=object), np.asarray(codes))
+
+
+# TEMPO enhancement: NO2 (µg/m³) above each threshold adds the matching AQI points
+NO2_THRESHOLDS = np.array([25, 35, 50], dtype=float)
+NO2_ADJUSTMENTS = np.array([0, 5, 12, 20], dtype=float)
+
+
+def adjust_for_no2(base_aqi, no2):
+    """Raise PM2.5-based AQI by the TEMPO NO2 bump, capped at 500; NaN NO2 adds nothing."""
+    no2 = np.asarray(no2, dtype=float)
+    bump = NO2_ADJUSTMENTS[np.searchsorted(NO2_THRESHOLDS, np.nan_to_num(no2, nan=0.0), side="left")]
+    return np.minimum(np.asarray(base_aqi, dtype=float) + bump, 500)
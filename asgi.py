@@ -0,0 +1,153 @@
+"""ASGI entry point: the Flask app with provider I/O moved onto an event loop.
+
+    uvicorn asgi:app --port 8080
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+
+/dashboard and /chat first build their location snapshot with
+async_providers, so waiting on Open-Meteo, GPCP or OpenAQ holds no thread.
+The request is then handed to the unchanged Flask app, which finds the
+snapshot cached; only that short render (and the Groq call) uses one of
+WSGI_THREADS worker threads.
+"""
+import asyncio, io, json, os, sys
+from urllib.parse import parse_qs
+from app import app as flask_app
+from async_providers import fetch_all
+from cache import snap
+import metrics
+from snapshot import cached_snapshot, save_snapshot, score_snapshot
+
+# Flask calls allowed to run at once, like gunicorn's --threads
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", "8"))
+_wsgi_slots = asyncio.Semaphore(WSGI_THREADS)
+
+# Routes whose snapshot is built on the loop before Flask sees the request
+SNAPSHOT_ROUTES = {"/dashboard", "/chat"}
+
+# One build per cell at a time; concurrent requests for it wait on the same task
+_building = {}
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    body = await _read_body(receive)
+    # Started here so the async fetch shows up in Flask's request log line
+    token = metrics.start_request() if scope["path"] != "/metrics" else None
+    try:
+        if scope["path"] in SNAPSHOT_ROUTES:
+            try:
+                await _prepare_snapshot(scope, body)
+            except Exception as e:
+                # Flask builds it the blocking way instead
+                print("Async snapshot error:", e)
+        await _call_flask(scope, body, send)
+    finally:
+        metrics.reset_request(token)
+
+
+async def _prepare_snapshot(scope, body):
+    query = {name: values[0] for name, values in parse_qs(scope["query_string"].decode("latin1")).items()}
+    arg = query.get
+    if scope["path"] == "/chat":
+        lat, lon = arg("lat", "6.5244"), arg("lon", "3.3792")  # same fallback as /chat
+        snapshot_id = arg("snapshot")
+        if not snapshot_id:
+            try:
+                snapshot_id = (json.loads(body or b"null") or {}).get("snapshot")
+            except (ValueError, AttributeError):
+                snapshot_id = None
+    else:
+        lat, lon, snapshot_id = arg("lat"), arg("lon"), None
+    try:
+        cell = (snap(lat), snap(lon))
+    except (TypeError, ValueError):
+        return
+    if cached_snapshot(lat, lon, snapshot_id) is not None:
+        return
+
+    task = _building.get(cell)
+    if task is None:
+        task = asyncio.ensure_future(_build(lat, lon))
+        _building[cell] = task
+        task.add_done_callback(lambda _: _building.pop(cell, None))
+    await task
+
+
+async def _build(lat, lon):
+    fetched = await fetch_all(lat, lon)
+    # Scoring writes the readings to the history store; keep SQLite off the loop
+    save_snapshot(await asyncio.to_thread(score_snapshot, lat, lon, fetched))
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name, value = name.decode("latin1").upper().replace("-", "_"), value.decode("latin1")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def _in_thread(fn, *args):
+    async with _wsgi_slots:
+        return await asyncio.to_thread(fn, *args)
+
+
+async def _call_flask(scope, body, send):
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in headers]
+
+    result = await _in_thread(flask_app, _environ(scope, body), start_response)
+    chunks = iter(result)
+    try:
+        await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+        # Streamed responses (NDJSON, SSE) are pulled one chunk per thread hop
+        while True:
+            chunk = await _in_thread(next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(result, "close"):
+            await asyncio.to_thread(result.close)
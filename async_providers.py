@@ -0,0 +1,147 @@
+import asyncio, datetime
+from cache import provider_cache
+from http_client import client
+from metrics import cache_lookup, fallback, timed
+from stations import catalog, parse_stations, region_of, region_url
+import providers
+from providers import (PROVIDER_DEADLINE, collect_results, fallback_city, fallback_ground_data,
+                       fallback_weather, no_tempo, no_weather)
+
+# Event-loop versions of the provider fetchers for the ASGI app. They share
+# URLs, parsers and cache entries with providers.py, so a cell fetched by
+# either one is warm for both.
+
+
+async def _cached(fetcher, fetch, lat, lon, *args):
+    key = fetcher.key(lat, lon, *args)
+    hit, value = provider_cache.get(key)
+    cache_lookup(key[0], hit)
+    if hit:
+        return value
+    with timed(key[0]):
+        value = await fetch(lat, lon, *args)
+    if value is not None:
+        provider_cache.set(key, value, fetcher.ttl)
+    return value
+
+
+async def _reverse_geocode(lat, lon):
+    try:
+        return providers.parse_geocode(await client("nominatim").aget(providers.geocode_url(lat, lon)))
+    except Exception as e:
+        print("Geocoding error:", e)
+    return None
+
+
+# Region fetches in flight, so concurrent requests in one region share a call
+_station_loads = {}
+
+
+async def _fetch_region(region):
+    try:
+        response = await client("openaq").aget(region_url(providers.PROVIDER_URLS["openaq"], region))
+        stations = parse_stations(response)
+    except Exception as e:
+        print("OpenAQ error:", e)
+        stations = None
+    catalog.store(region, stations)
+
+
+async def _latest_pm25(lat, lon):
+    if catalog.covers(lat, lon):
+        return catalog.lookup(lat, lon)
+    region = region_of(lat, lon)
+    task = _station_loads.get(region)
+    if task is None:
+        task = _station_loads[region] = asyncio.ensure_future(_fetch_region(region))
+        task.add_done_callback(lambda _: _station_loads.pop(region, None))
+    with timed("openaq"):
+        await task
+    return catalog.lookup(lat, lon)
+
+
+async def _tempo_no2(lat, lon):
+    stored = providers.stored_tempo(lat, lon)
+    if stored is not None:
+        return stored
+    try:
+        r = await client("gesdisc").aget(providers.tempo_url(lat, lon), headers=providers.tempo_headers())
+        return providers.parse_tempo(r)
+    except Exception as e:
+        print("TEMPO error:", str(e))
+    return None
+
+
+async def _open_meteo(lat, lon):
+    return providers.parse_open_meteo(await client("open-meteo").aget(providers.open_meteo_url(lat, lon)))
+
+
+async def _gpcp_precip(lat, lon, date):
+    rainfall = providers.known_rainfall(lat, lon, date)
+    if rainfall is not None:
+        return rainfall
+    try:
+        response = await client("gpm").aget(providers.gpcp_url(lat, lon, date))
+        if response.status_code == 200:
+            # netCDF decoding is CPU work; keep it off the event loop
+            return await asyncio.to_thread(providers.store_gpcp, response.content, lat, lon, date)
+    except Exception as e:
+        print("IMERG error:", e)
+    return None
+
+
+async def get_city_name(lat, lon):
+    return await _cached(providers.reverse_geocode, _reverse_geocode, lat, lon) or fallback_city()
+
+
+async def get_ground_data(lat, lon):
+    ground = await _latest_pm25(lat, lon)
+    if ground is None:
+        fallback("ground", "no_data")
+        return fallback_ground_data()
+    return ground
+
+
+async def get_tempo_data(lat, lon):
+    return await _cached(providers.tempo_no2, _tempo_no2, lat, lon) or no_tempo()
+
+
+async def get_weather(lat, lon):
+    try:
+        weather = await _cached(providers.open_meteo, _open_meteo, lat, lon)
+    except Exception as e:
+        print("Open-Meteo API error:", str(e))
+        fallback("weather", "error")
+        return fallback_weather(lat)
+    return weather or no_weather()
+
+
+async def get_rainfall(lat, lon):
+    date = datetime.datetime.utcnow().strftime("%Y-%m-%d")
+    return await _cached(providers.gpcp_precip, _gpcp_precip, lat, lon, date)
+
+
+async def fetch_all(lat, lon, deadline=None):
+    """``providers.fetch_all`` on the event loop: same providers, deadline and
+    fallbacks, but waiting costs no thread."""
+    deadline = PROVIDER_DEADLINE if deadline is None else deadline
+    calls = {
+        "city": get_city_name,
+        "tempo": get_tempo_data,
+        "weather": get_weather,
+        "rainfall": get_rainfall,
+        "ground": get_ground_data,
+    }
+    tasks = {name: asyncio.ensure_future(fn(lat, lon)) for name, fn in calls.items()}
+    with timed("fetch_all"):
+        await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in tasks.values():
+        if not task.done():
+            # Stragglers finish in the background and still fill the cache
+            _stragglers.add(task)
+            task.add_done_callback(_stragglers.discard)
+    return collect_results(tasks, lat, deadline)
+
+
+# The event loop only holds weak references to tasks
+_stragglers = set()
@@ -0,0 +1,128 @@
+import json, os, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+from aqi import CATEGORIES, compute_aqi, adjust_for_no2, category_codes
+from cache import snap
+from history import history
+from providers import latest_pm25, tempo_no2, submit
+
+MAX_BATCH_POINTS = int(os.getenv("MAX_BATCH_POINTS", "1000"))
+
+# Wall-clock budget for a whole batch, and how many grid cells one batch fetches at once
+BATCH_DEADLINE = float(os.getenv("BATCH_DEADLINE", "60"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+# Batch cells run on their own pool, bounded across all batch requests, so
+# concurrent batches queue here instead of delaying the dashboard's
+# fetch_all() on the shared provider pool
+_batch_pool = ThreadPoolExecutor(max_workers=int(os.getenv("BATCH_WORKERS", "8")), thread_name_prefix="batch")
+
+
+def parse_points(body, content_type):
+    """Read ``[{"lat":..,"lon":..}, ...]`` (or ``{"points": [...]}``, or one point
+    per NDJSON line) into a list of (lat, lon) floats. Raises ValueError."""
+    text = body.decode("utf-8") if isinstance(body, bytes) else body
+    if "ndjson" in (content_type or ""):
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        items = json.loads(text or "null")
+        if isinstance(items, dict):
+            items = items.get("points")
+    if not isinstance(items, list) or not items:
+        raise ValueError("expected a non-empty list of points")
+    if len(items) > MAX_BATCH_POINTS:
+        raise ValueError(f"at most {MAX_BATCH_POINTS} points per request")
+
+    points = []
+    for i, item in enumerate(items):
+        try:
+            lat, lon = (item["lat"], item["lon"]) if isinstance(item, dict) else item
+            lat, lon = float(lat), float(lon)
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"point {i} is not a lat/lon pair")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError(f"point {i} is out of range")
+        points.append((lat, lon))
+    return points
+
+
+def group_by_cell(points):
+    cells = {}
+    for i, (lat, lon) in enumerate(points):
+        cells.setdefault((snap(lat), snap(lon)), []).append(i)
+    return cells
+
+
+def fetch_cell(lat, lon):
+    ground = latest_pm25(lat, lon)
+    tempo = tempo_no2(lat, lon)
+    history.record(lat, lon, pm25=ground["pm25"] if ground else None,
+                   no2=round(float(tempo[1]), 2) if tempo and tempo[1] else None)
+    return {
+        "pm25": ground["pm25"] if ground else None,
+        "pm25_source": f"OpenAQ: {ground['station']}" if ground else "unavailable",
+        "no2": round(float(tempo[1]), 2) if tempo else None,
+        "no2_source": tempo[0].get("source", "NASA TEMPO Satellite") if tempo else "unavailable",
+    }
+
+
+def score_cell(reading):
+    pm25 = np.nan if reading["pm25"] is None else reading["pm25"]
+    no2 = np.nan if reading["no2"] is None else reading["no2"]
+    aqi = adjust_for_no2(compute_aqi("pm25", pm25), no2)
+    code = int(category_codes(aqi))
+    return (None if np.isnan(aqi) else int(aqi)), (CATEGORIES[code] if code >= 0 else "Unknown")
+
+
+def stream_readings(points, deadline=None):
+    """Yield one result dict per input point as soon as its grid cell is fetched.
+
+    Each unique cell is fetched once; results arrive in completion order and
+    carry the input ``index``. Cells still pending at the deadline are
+    reported with null readings.
+    """
+    deadline = time.monotonic() + (BATCH_DEADLINE if deadline is None else deadline)
+    cells = group_by_cell(points)
+    queue = list(cells)
+    pending = {}
+
+    while queue or pending:
+        while queue and len(pending) < BATCH_CONCURRENCY:
+            cell = queue.pop()
+            pending[submit(fetch_cell, *cell, pool=_batch_pool)] = cell
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            cell = pending.pop(future)
+            try:
+                reading = future.result()
+            except Exception as e:
+                print("Batch cell error:", e)
+                reading = None
+            yield from _results(cell, reading, cells[cell], points)
+
+    # Cells still queued behind other batches are dropped rather than fetched for nobody
+    for future in pending:
+        future.cancel()
+    for cell in list(pending.values()) + queue:
+        yield from _results(cell, None, cells[cell], points)
+
+
+def _results(cell, reading, indexes, points):
+    if reading is None:
+        reading = {"pm25": None, "pm25_source": "timeout", "no2": None, "no2_source": "timeout"}
+    aqi, classification = score_cell(reading)
+    for i in indexes:
+        lat, lon = points[i]
+        yield {
+            "index": i,
+            "lat": lat,
+            "lon": lon,
+            "cell": list(cell),
+            "aqi": aqi,
+            "classification": classification,
+            "pollutants": {"pm25": reading["pm25"], "no2": reading["no2"]},
+            "sources": {"pm25": reading["pm25_source"], "no2": reading["no2_source"]},
+        }
@@ -0,0 +1,92 @@
+"""Check the vectorized AQI engine against the original scalar code and time both.
+
+    python bench/bench_aqi.py [n_values]
+"""
+import os, sys, time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aqi import CATEGORIES, compute_aqi, category_codes, category_labels
+
+
+# Reference: the scalar implementation app.py shipped before aqi.py
+def reference_aqi_pm25(value):
+    breakpoints = [
+        (0.0, 12.0, 0, 50),
+        (12.1, 35.4, 51, 100),
+        (35.5, 55.4, 101, 150),
+        (55.5, 150.4, 151, 200),
+        (150.5, 250.4, 201, 300),
+        (250.5, 500.4, 301, 500),
+    ]
+    for (Clow, Chigh, Ilow, Ihigh) in breakpoints:
+        if Clow <= value <= Chigh:
+            return round(((Ihigh - Ilow)/(Chigh - Clow))*(value - Clow) + Ilow)
+    return 500
+
+
+def reference_classify(aqi):
+    if aqi <= 50: return "Good"
+    elif aqi <= 100: return "Moderate"
+    elif aqi <= 150: return "Unhealthy for Sensitive Groups"
+    elif aqi <= 200: return "Unhealthy"
+    elif aqi <= 300: return "Very Unhealthy"
+    else: return "Hazardous"
+
+
+def in_reference_table(value):
+    # The reference returns 500 for values between breakpoint rows; aqi.py does not
+    return any(lo <= value <= hi for lo, hi in
+               [(0.0, 12.0), (12.1, 35.4), (35.5, 55.4), (55.5, 150.4), (150.5, 250.4), (250.5, 500.4)]) \
+        or value > 500.4
+
+
+def check_correctness(rng):
+    samples = np.concatenate([
+        np.round(rng.uniform(0, 600, 200_000), 1),
+        rng.uniform(0, 600, 200_000),
+        [0.0, 12.0, 12.1, 35.4, 35.5, 55.4, 55.5, 150.4, 150.5, 250.4, 250.5, 500.4, 500.5, 1000.0],
+    ])
+    samples = samples[[in_reference_table(v) for v in samples]]
+    expected = np.array([reference_aqi_pm25(v) for v in samples], dtype=float)
+    got = compute_aqi("pm25", samples)
+    mismatches = np.flatnonzero(got != expected)
+    assert mismatches.size == 0, f"AQI mismatch at {samples[mismatches[:5]]}: {got[mismatches[:5]]} vs {expected[mismatches[:5]]}"
+
+    labels = category_labels(category_codes(got))
+    assert all(label == reference_classify(a) for label, a in zip(labels, expected)), "classification mismatch"
+    print(f"correctness: {samples.size} PM2.5 values match the scalar reference")
+
+
+def bench(n, rng):
+    values = rng.uniform(0, 500, n)
+
+    scalar_n = min(n, 200_000)
+    start = time.perf_counter()
+    for v in values[:scalar_n]:
+        reference_classify(reference_aqi_pm25(v))
+    scalar = (time.perf_counter() - start) * n / scalar_n
+
+    start = time.perf_counter()
+    codes = category_codes(compute_aqi("pm25", values))
+    vectorized = time.perf_counter() - start
+    assert codes.size == n and set(np.unique(codes)) <= set(range(len(CATEGORIES)))
+
+    print(f"scalar loop : {scalar * 1000:9.1f} ms for {n:,} values ({n / scalar:,.0f}/s, extrapolated from {scalar_n:,})")
+    print(f"vectorized  : {vectorized * 1000:9.1f} ms for {n:,} values ({n / vectorized:,.0f}/s)")
+    print(f"speedup     : {scalar / vectorized:9.1f}x")
+
+    for pollutant, top in (("pm10", 604), ("o3", 200), ("no2", 2049)):
+        values = rng.uniform(0, top, n)
+        start = time.perf_counter()
+        compute_aqi(pollutant, values)
+        elapsed = time.perf_counter() - start
+        print(f"{pollutant:<12}: {elapsed * 1000:9.1f} ms for {n:,} values")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(0)
+    check_correctness(rng)
+    bench(n, rng)
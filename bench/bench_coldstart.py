@@ -0,0 +1,76 @@
+"""Cold-start cost of the app: import time and the first static page.
+
+Each run is a fresh interpreter under ``python -X importtime`` that imports
+app.py and serves /, /about and /share-with-us, as a serverless cold start
+would. Reports the median times, the slowest imports, and fails when the
+median exceeds --budget-ms or when a static page pulls in one of the heavy
+modules that only data routes should load.
+
+    python bench/bench_coldstart.py [--runs 5] [--budget-ms 400] [--top 12]
+"""
+import argparse, json, os, re, statistics, subprocess, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules a static page must not import
+HEAVY = ("numpy", "netCDF4", "groq", "requests", "httpx", "sqlite3")
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+statuses = [client.get(path).status_code for path in ("/", "/about", "/share-with-us")]
+served = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "first_pages_ms": (served - imported) * 1000,
+                  "statuses": statuses, "heavy": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY,)
+
+IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def run_once():
+    env = dict(os.environ, GROQ_API_KEY=os.environ.get("GROQ_API_KEY", "coldstart"), PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    # What app.py itself imports (second nesting level) with cumulative microseconds
+    result["imports"] = {m.group(4): int(m.group(2)) for m in IMPORTTIME.finditer(proc.stderr) if len(m.group(3)) == 3}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=400, help="max median import + first pages")
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    import_ms = statistics.median(r["import_ms"] for r in runs)
+    pages_ms = statistics.median(r["first_pages_ms"] for r in runs)
+    total = statistics.median(r["import_ms"] + r["first_pages_ms"] for r in runs)
+    print(f"{args.runs} cold starts: import app {import_ms:.0f} ms, first static pages {pages_ms:.0f} ms, "
+          f"total {total:.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+    slowest = sorted(runs[-1]["imports"].items(), key=lambda item: -item[1])[:args.top]
+    print("slowest imports under app (cumulative ms):")
+    for name, us in slowest:
+        print(f"  {name:<28} {us / 1000:8.1f}")
+
+    failures = []
+    if any(status != 200 for r in runs for status in r["statuses"]):
+        failures.append(f"static pages answered {runs[-1]['statuses']}")
+    heavy = sorted({m for r in runs for m in r["heavy"]})
+    if heavy:
+        failures.append(f"static pages imported {', '.join(heavy)}")
+    if total > args.budget_ms:
+        failures.append(f"cold start {total:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    for failure in failures:
+        print("FAIL:", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
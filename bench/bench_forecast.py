@@ -0,0 +1,74 @@
+"""Time the forecast engine's batch refit, incremental updates and lookups.
+
+Fills a throwaway history store with a week of synthetic hourly readings
+(diurnal cycle + a wind effect + noise) for n_cells cells, then reports the
+full-refit time, the cost of one observe() and of one daily() lookup, and
+how well the fit recovers the synthetic wind effect.
+
+    python bench/bench_forecast.py [n_cells]
+"""
+import os, sys, tempfile, time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["HISTORY_DB"] = os.path.join(tempfile.mkdtemp(prefix="igun-forecast-"), "history.sqlite3")
+
+from forecast import WEATHER, Forecaster
+from history import current_hour, history
+
+WIND_EFFECT = -2.0  # AQI per km/h, the effect the fit should recover
+
+
+def synthetic_rows(n_cells, hours, rng):
+    now = current_hour()
+    hour = np.arange(now - hours + 1, now + 1)
+    rows = []
+    for c in range(n_cells):
+        lat, lon = round(-60 + (c // 100) * 0.1, 1), round(3.0 + (c % 100) * 0.1, 1)
+        base = rng.uniform(30, 120)
+        temp = 25 + 5 * np.sin(2 * np.pi * (hour % 24 - 9) / 24) + rng.normal(0, 1, hours)
+        humidity = rng.uniform(40, 90, hours)
+        wind = rng.uniform(2, 20, hours)
+        aqi = base + 15 * np.cos(2 * np.pi * (hour % 24 - 8) / 24) + WIND_EFFECT * (wind - 10) + rng.normal(0, 3, hours)
+        rows += [(lat, lon, int(h), {"aqi": float(a), "temp": float(t), "humidity": float(u), "wind": float(w)})
+                 for h, a, t, u, w in zip(hour, aqi, temp, humidity, wind)]
+    return rows
+
+
+def main():
+    n_cells = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = np.random.default_rng(0)
+    rows = synthetic_rows(n_cells, 7 * 24, rng)
+    for i in range(0, len(rows), 50_000):
+        history.record_many(rows[i:i + 50_000])
+    print(f"{n_cells} cells, {len(rows)} hourly rows")
+
+    forecaster = Forecaster()
+    start = time.perf_counter()
+    fitted = forecaster.fit()
+    print(f"full refit: {fitted} cells in {time.perf_counter() - start:.2f}s")
+
+    wind_scale = dict((name, scale) for name, _, scale in WEATHER)["wind"]
+    wind_coef = forecaster._coef[:, -1] / wind_scale
+    print(f"recovered wind effect: median {np.median(wind_coef):.2f} AQI per km/h (true {WIND_EFFECT})")
+
+    lat, lon = rows[0][0], rows[0][1]
+    now = current_hour()
+    updates = 1000
+    start = time.perf_counter()
+    for k in range(1, updates + 1):
+        forecaster.observe(lat, lon, now + k, 80.0, 27.0, 70.0, 8.0)
+    print(f"observe(): {(time.perf_counter() - start) / updates * 1e6:.0f} us per new hour")
+
+    ahead = {"hours": list(range(now + 1, now + 120)), "temp": [27.0] * 119, "humidity": [70.0] * 119,
+             "wind": [8.0] * 119}
+    weather = {"temp": 27.0, "humidity": 70.0, "wind": 8.0}
+    calls = 5000
+    start = time.perf_counter()
+    for k in range(calls):
+        forecaster.daily(rows[(k % n_cells) * 168][0], rows[(k % n_cells) * 168][1], 80, weather, ahead)
+    print(f"daily() lookup: {(time.perf_counter() - start) / calls * 1e6:.0f} us per location")
+
+
+if __name__ == "__main__":
+    main()
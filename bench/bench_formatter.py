@@ -0,0 +1,93 @@
+"""Check the single-pass formatter against the original six regex passes and time both.
+
+    python bench/bench_formatter.py [repeat]
+"""
+import os, random, re, sys, time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formatter import StreamFormatter, format_llm_response
+
+
+# Reference: the format_llm_response app.py shipped before formatter.py
+def reference_format(text):
+    text = re.sub(r'(\. )([A-Z])', r'\1\n\n\2', text)
+    text = re.sub(r'[\-\*]\s*', '• ', text)
+    text = re.sub(r'(\d+\.\s)', r'\n\1', text)
+    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+    text = re.sub(r'(IMPORTANT|WARNING|ALERT|CAUTION|URGENT)([:\s])', r'**\1**\2', text, flags=re.IGNORECASE)
+    text = re.sub(r'(should|must|avoid|recommended|advised)(\s+[^.]+\.)', r'**\1**\2', text, flags=re.IGNORECASE)
+    return text.strip()
+
+
+# Answers shaped like what the chat prompt asks the model for
+GOLDEN = [
+    "The current AQI in Lagos is 87, which is Moderate. Sensitive groups should limit prolonged outdoor exertion. "
+    "WARNING: NO2 levels near major roads are elevated.\n\nHere are some recommendations:\n"
+    "- Wear an N95 mask outdoors\n- Keep windows closed during rush hour\n"
+    "1. Check the AQI before exercising. 2. Avoid busy roads when walking.\n\n\n"
+    "It is recommended that children stay indoors after 4 pm.\n",
+    "IMPORTANT: air quality is Unhealthy (AQI 168).\n\n* Avoid outdoor exercise.\n* People with asthma must keep "
+    "their inhalers nearby.\n\n\n\nNASA TEMPO shows NO2 at 42.5 ug/m3, roughly 2x the city average.",
+    "Yes, it is safe to go running. The AQI is 34 (Good) and wind is 18 km/h. Caution: pollen counts are high, so "
+    "allergy sufferers are advised to run early in the morning.",
+    "1. Stay hydrated.\n2. Avoid the Third Mainland Bridge between 7-9 am.\n3. Urgent care is advised if you feel "
+    "chest tightness.\n   \n  \n4. Use an air purifier indoors",
+    "Rainfall of 12.3 mm is expected. Rain usually clears particulates, so tomorrow should be cleaner... "
+    "Alert - thunderstorms can push ozone up briefly. e.g. watch for headaches. You must not ignore them.",
+    "Résumé: l'air à Abidjan est modéré. Les personnes sensibles should rest. Ünusual NO2 spike — caution advised.",
+    "",
+    "   \n\n  ",
+]
+
+
+def random_answer(rng, words=400):
+    vocab = ["air", "quality", "AQI", "is", "Moderate", "today", "NO2", "PM2.5", "levels", "near", "roads", "should",
+             "must", "avoid", "recommended", "advised", "Important:", "warning", "alert", "mask", "outdoors", "12.5",
+             "ug/m3", "children", "asthma", "- ", "* ", "\n", "\n\n\n", "1.", "2.", "3.", "Stay", "indoors", "The"]
+    out = []
+    for _ in range(words):
+        out.append(rng.choice(vocab))
+        out.append(". " if rng.random() < 0.08 else " ")
+    return "".join(out)
+
+
+def streamed(text, rng):
+    formatter, out, i = StreamFormatter(), [], 0
+    while i < len(text):
+        size = rng.randint(1, 12)
+        out.append(formatter.feed(text[i:i + size]))
+        i += size
+    out.append(formatter.finish())
+    return "".join(out)
+
+
+def check_correctness(rng):
+    corpus = GOLDEN + [random_answer(rng, rng.randint(1, 600)) for _ in range(2000)]
+    for text in corpus:
+        expected = reference_format(text)
+        assert format_llm_response(text) == expected, f"mismatch for {text[:80]!r}"
+        assert streamed(text, rng) == expected, f"stream mismatch for {text[:80]!r}"
+    print(f"correctness: {len(corpus)} answers match the six-pass reference (whole and streamed)")
+
+
+def bench(repeat, rng):
+    for size in (400, 3_000, 12_000):
+        text = GOLDEN[0] * (size // len(GOLDEN[0]) + 1)
+        text = text[:size]
+        timings = {}
+        for name, fn in (("six passes", reference_format), ("single pass", format_llm_response)):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                fn(text)
+            timings[name] = (time.perf_counter() - start) / repeat
+        print(f"{size:>6,} chars: six passes {timings['six passes'] * 1e6:8.1f} us, "
+              f"single pass {timings['single pass'] * 1e6:8.1f} us "
+              f"({timings['six passes'] / timings['single pass']:.2f}x)")
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rng = random.Random(0)
+    check_correctness(rng)
+    bench(repeat, rng)
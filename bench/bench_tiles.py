@@ -0,0 +1,61 @@
+"""Time AQI heatmap tiles and check the coarse PM2.5 pass against the exact one.
+
+Loads n_stations synthetic fresh stations around Lagos into the station
+catalog (no network) and renders zoom-10 tiles over them with the tile cache
+bypassed.
+
+    python bench/bench_tiles.py [n_stations]
+"""
+import math, os, sys, time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aqi import category_codes
+from heatmap import _bilinear, _coarse, encode_png, layers, tile_axes
+from stations import catalog
+
+
+def tile_of(lat, lon, z):
+    n = 2 ** z
+    return int((lon + 180) / 360 * n), int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+
+
+def main():
+    n_stations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = np.random.default_rng(0)
+    now = time.time()
+    # Every region under the tiles counts as loaded, so layers() never goes to the network
+    catalog.store((12, 6), [(f"S{i}", 6.5 + rng.uniform(-0.4, 0.4), 3.4 + rng.uniform(-0.4, 0.4),
+                             float(rng.uniform(5, 80)), now) for i in range(n_stations)])
+    for region in catalog.missing([(r, c) for r in range(10, 16) for c in range(4, 10)]):
+        catalog.store(region, [])
+
+    z = 10
+    x0, y0 = tile_of(6.5, 3.4, z)
+    tiles = [(x0 + dx, y0 + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+    timings = []
+    for x, y in tiles * 3:
+        start = time.perf_counter()
+        encode_png(layers(*tile_axes(z, x, y))["aqi"])
+        timings.append(time.perf_counter() - start)
+    print(f"{n_stations} stations, 256x256 tile: median {np.median(timings) * 1000:.1f} ms, "
+          f"max {max(timings) * 1000:.1f} ms")
+
+    lats, lons = tile_axes(z, x0, y0)
+    exact = catalog.grid(lats, lons)
+    rows, cols = _coarse(len(lats)), _coarse(len(lons))
+    start = time.perf_counter()
+    approx = _bilinear(catalog.grid(lats[rows], lons[cols]), rows, cols, len(lats), len(lons))
+    coarse_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    catalog.grid(lats, lons)
+    exact_ms = (time.perf_counter() - start) * 1000
+    error = np.abs(exact - approx)
+    print(f"PM2.5 exact {exact_ms:.1f} ms vs coarse {coarse_ms:.1f} ms; error median {np.nanmedian(error):.3f}, "
+          f"max {np.nanmax(error):.2f} ug/m3; AQI category differs on "
+          f"{(category_codes(exact) != category_codes(approx)).mean():.2%} of pixels")
+
+
+if __name__ == "__main__":
+    main()
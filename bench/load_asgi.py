@@ -0,0 +1,137 @@
+"""Concurrent-request capacity of the WSGI app vs asgi.py with slow upstreams.
+
+Every provider call is stubbed to take --delay seconds (no network). Cold
+/dashboard loads for distinct cells are fired all at once while /about is
+polled; the WSGI run gets gunicorn's 8 threads, the ASGI run the same
+8 WSGI_THREADS plus the event loop.
+
+    python bench/load_asgi.py [--requests 64] [--delay 1.0] [--threads 8]
+"""
+import argparse, asyncio, contextlib, io, os, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GROQ_API_KEY", "load-test")
+os.environ["PREFETCH"] = "0"
+# Synthetic readings and grids go to throwaway stores, not the local app's
+_scratch = tempfile.mkdtemp(prefix="igun-bench-")
+os.environ["GRID_STORE_DIR"] = _scratch
+os.environ["HISTORY_DB"] = os.path.join(_scratch, "history.sqlite3")
+
+import httpx
+import requests
+
+DELAY = 1.0
+_real_async_get = httpx.AsyncClient.get
+
+
+class _Reply:
+    def __init__(self, url):
+        if "open-meteo" in url:
+            self.status_code, self._json = 200, {"current": {"temperature_2m": 27, "relative_humidity_2m": 70,
+                                                             "wind_speed_10m": 8}}
+        elif "openaq" in url:
+            # One fresh station at the centre of the requested region
+            lat, lon = url.split("coordinates=")[1].split("&")[0].split(",")
+            self.status_code, self._json = 200, {"results": [{
+                "location": "Stub", "coordinates": {"latitude": float(lat), "longitude": float(lon)},
+                "measurements": [{"parameter": "pm25", "value": 24.0,
+                                  "lastUpdated": time.strftime("%Y-%m-%dT%H:00:00+00:00", time.gmtime())}]}]}
+        elif "nominatim" in url:
+            self.status_code, self._json = 200, {"address": {"city": "Lagos", "country": "Nigeria"}}
+        else:
+            self.status_code, self._json = 404, None
+        self.content = b""
+
+    def json(self):
+        if self._json is None:
+            raise ValueError("no JSON")
+        return self._json
+
+
+def slow_get(session, url, **kwargs):
+    time.sleep(DELAY)
+    return _Reply(url)
+
+
+async def slow_async_get(client, url, **kwargs):
+    if not str(url).startswith("https://"):
+        return await _real_async_get(client, url, **kwargs)  # the load generator's own requests
+    await asyncio.sleep(DELAY)
+    reply = _Reply(str(url))
+    return httpx.Response(reply.status_code, json=reply._json) if reply._json else httpx.Response(reply.status_code)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else float("nan")
+
+
+def report(name, elapsed, dashboards, abouts):
+    ok = sum(1 for status, _ in dashboards if status == 200)
+    latencies = [t for _, t in dashboards]
+    about = [t for _, t in abouts]
+    print(f"{name:<5} {len(dashboards)} dashboards in {elapsed:6.2f}s ({ok} ok, {len(dashboards) / elapsed:6.1f} req/s)  "
+          f"dashboard p50 {percentile(latencies, 50):5.2f}s p95 {percentile(latencies, 95):5.2f}s  "
+          f"/about p50 {percentile(about, 50) * 1000:7.1f}ms p95 {percentile(about, 95) * 1000:7.1f}ms")
+
+
+def run_wsgi(n, threads, lat0):
+    from app import app
+    client = app.test_client()
+
+    def timed(path, queued):
+        # Latency counts the wait for a free thread, as a client would see it
+        status = client.get(path).status_code
+        return status, time.perf_counter() - queued
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        dashboards = [pool.submit(timed, f"/dashboard?lat={lat0 + i * 0.1:.4f}&lon=3.3792", time.perf_counter())
+                      for i in range(n)]
+        # /about queues behind the dashboards for a thread, as it would in gunicorn
+        abouts = [pool.submit(timed, "/about", time.perf_counter()) for _ in range(10)]
+        dashboards = [f.result() for f in dashboards]
+        abouts = [f.result() for f in abouts]
+    return time.perf_counter() - start, dashboards, abouts
+
+
+async def run_asgi(n, lat0):
+    from asgi import app
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=None) as client:
+        async def timed(path):
+            start = time.perf_counter()
+            status = (await client.get(path)).status_code
+            return status, time.perf_counter() - start
+
+        start = time.perf_counter()
+        dashboards = [asyncio.ensure_future(timed(f"/dashboard?lat={lat0 + i * 0.1:.4f}&lon=3.3792")) for i in range(n)]
+        await asyncio.sleep(0.05)
+        abouts = [await timed("/about") for _ in range(10)]
+        dashboards = await asyncio.gather(*dashboards)
+        return time.perf_counter() - start, dashboards, abouts
+
+
+def main():
+    global DELAY
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--delay", type=float, default=1.0)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    DELAY = args.delay
+    os.environ["WSGI_THREADS"] = str(args.threads)
+    requests.Session.get = slow_get
+    httpx.AsyncClient.get = slow_async_get
+
+    print(f"{args.requests} cold /dashboard loads, every upstream call takes {DELAY}s, {args.threads} threads")
+    with contextlib.redirect_stdout(io.StringIO()):
+        wsgi = run_wsgi(args.requests, args.threads, lat0=-60)
+        asgi = asyncio.run(run_asgi(args.requests, lat0=10))
+    report("wsgi", *wsgi)
+    report("asgi", *asgi)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Offline load test: the real app against recorded provider fixtures.
+
+Starts bench/stub_server.py and the app on local ports, replaces the Groq
+client with a canned one, then drives each scenario at a fixed concurrency and
+reports p50/p95/p99 latency and requests/sec. Needs no network.
+
+    python bench/load_test.py [--requests 200] [--concurrency 16] [--latency 80]
+                              [--failure-rate 0.05] [--server wsgi|asgi]
+                              [--scenarios dashboard,chat,chat-stream,batch]
+                              [--json results.json] [--max-p95 2000]
+
+--max-p95 (ms) makes the run exit non-zero when any scenario is slower, so it
+can gate a change. Dashboard cells sit inside the 1° GPCP cell of the recorded
+.nc4 subset (around Lagos) so rainfall resolves like production.
+"""
+import argparse, contextlib, io, json, logging, os, random, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from stub_server import StubServer
+
+QUESTIONS = [
+    "Is it safe to go jogging this evening?",
+    "Should my kids play outside after school?",
+    "What mask should I wear on my commute?",
+    "How does today's rain affect the air?",
+    "Can I open the windows tonight?",
+    "Is the air bad for my asthma right now?",
+    "Which hours are best for outdoor exercise?",
+    "Why is NO2 high near the main roads?",
+]
+
+ANSWER = ("The current AQI is Moderate. Sensitive groups should limit prolonged outdoor exertion. "
+          "Here are some recommendations:\n- Wear an N95 mask on busy roads\n- Keep windows closed at rush hour\n"
+          "1. Check the AQI before exercising. 2. Avoid the main roads when walking.\n\n"
+          "IMPORTANT: people with asthma must keep their inhalers nearby.")
+
+
+class StubGroq:
+    """Answers every completion with ANSWER after ``latency`` seconds."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, stream=False):
+        time.sleep(self.latency)
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=ANSWER))])
+        pieces = [ANSWER[i:i + 12] for i in range(0, len(ANSWER), 12)]
+        return (SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=p))]) for p in pieces)
+
+
+def lagos_cells(n, seed=0):
+    rng = random.Random(seed)
+    return [(round(rng.uniform(6.05, 6.95), 4), round(rng.uniform(3.05, 3.95), 4)) for _ in range(n)]
+
+
+def scenario_requests(name, i, cells, rng):
+    lat, lon = cells[i % len(cells)]
+    if name == "dashboard":
+        return "GET", f"/dashboard?lat={lat}&lon={lon}", {}
+    if name in ("chat", "chat-stream"):
+        stream = "&stream=1" if name == "chat-stream" else ""
+        question = QUESTIONS[i % len(QUESTIONS)]
+        return "POST", f"/chat?lat={lat}&lon={lon}{stream}", {"json": {"question": question}}
+    if name == "batch":
+        points = [{"lat": round(rng.uniform(6.05, 6.95), 4), "lon": round(rng.uniform(3.05, 3.95), 4)}
+                  for _ in range(25)]
+        return "POST", "/api/aqi", {"json": points}
+    raise ValueError(f"unknown scenario {name}")
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def drive(base_url, name, total, concurrency, cells):
+    local = threading.local()
+    rng = random.Random(1)
+    plans = [scenario_requests(name, i, cells, rng) for i in range(total)]
+
+    def one(plan):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        method, path, kwargs = plan
+        start = time.perf_counter()
+        try:
+            response = local.session.request(method, base_url + path, timeout=120, **kwargs)
+            response.content  # streamed bodies count until the last byte
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, plans))
+    elapsed = time.perf_counter() - start
+
+    latencies = [t * 1000 for t, _ in results]
+    return {
+        "scenario": name,
+        "requests": total,
+        "concurrency": concurrency,
+        "ok": sum(1 for _, ok in results if ok),
+        "errors": sum(1 for _, ok in results if not ok),
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+    }
+
+
+def start_app(kind):
+    """Serve the app on a free local port in a background thread; returns its URL."""
+    if kind == "asgi":
+        try:
+            import uvicorn
+        except ImportError:
+            sys.exit("--server asgi needs uvicorn (pip install uvicorn)")
+        from asgi import app
+        config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="error", lifespan="off")
+        server = uvicorn.Server(config)
+        threading.Thread(target=server.run, name="app-server", daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+        port = server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    from werkzeug.serving import make_server
+    from app import app
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="app-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--cells", type=int, default=40, help="distinct dashboard locations")
+    parser.add_argument("--latency", type=float, default=80, help="stub provider latency, ms")
+    parser.add_argument("--jitter", type=float, default=40, help="extra random provider latency, ms")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of provider calls failing with 503")
+    parser.add_argument("--llm-latency", type=float, default=300, help="stub Groq latency, ms")
+    parser.add_argument("--server", choices=("wsgi", "asgi"), default="wsgi")
+    parser.add_argument("--scenarios", default="dashboard,chat,chat-stream,batch")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--max-p95", type=float, help="fail if any scenario's p95 exceeds this (ms)")
+    args = parser.parse_args()
+
+    stub = StubServer(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate, seed=0).start()
+    os.environ.update(stub.environ())
+    os.environ.update({
+        "GROQ_API_KEY": "stub", "PREFETCH": "0", "GRID_REFRESH": "0", "REQUEST_LOG": "0",
+        "GRID_STORE_DIR": tempfile.mkdtemp(prefix="igun-bench-"),
+    })
+    # Synthetic readings go to a throwaway history store, not the local app's
+    os.environ["HISTORY_DB"] = os.path.join(os.environ["GRID_STORE_DIR"], "history.sqlite3")
+
+    quiet = io.StringIO()  # the app's print() diagnostics
+    with contextlib.redirect_stdout(quiet):
+        import app as app_module
+        app_module.groq_client = StubGroq(args.llm_latency / 1000)
+        base_url = start_app(args.server)
+
+        cells = lagos_cells(args.cells)
+        results = [drive(base_url, name.strip(), args.requests, args.concurrency, cells)
+                   for name in args.scenarios.split(",") if name.strip()]
+
+    print(f"{args.server} app, stub providers {args.latency:.0f}+{args.jitter:.0f} ms, "
+          f"{args.failure_rate:.0%} failures, Groq {args.llm_latency:.0f} ms")
+    print(f"{'scenario':<12} {'reqs':>5} {'conc':>5} {'ok':>5} {'err':>4} {'req/s':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for r in results:
+        print(f"{r['scenario']:<12} {r['requests']:>5} {r['concurrency']:>5} {r['ok']:>5} {r['errors']:>4} "
+              f"{r['rps']:>7} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8}")
+    print("provider calls:", ", ".join(f"{p} {n}" for p, n in stub.hits.items()), f"(injected failures {stub.failures})")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+    if args.max_p95 is not None:
+        slow = [r["scenario"] for r in results if r["p95_ms"] > args.max_p95]
+        if slow:
+            print(f"p95 above {args.max_p95} ms: {', '.join(slow)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
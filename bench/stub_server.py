@@ -0,0 +1,95 @@
+"""Local stand-in for every upstream provider, replaying bench/fixtures.
+
+    python bench/stub_server.py [--port 8099] [--latency 80] [--jitter 40] [--failure-rate 0.05]
+
+Point the app at it with NOMINATIM_URL, OPENAQ_URL, GESDISC_URL, OPEN_METEO_URL
+and GPM_URL (all http://127.0.0.1:<port>). Each response waits --latency ms
+(plus up to --jitter ms); --failure-rate of them return 503 instead.
+"""
+import argparse, os, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Path prefix -> (fixture file, content type)
+ROUTES = {
+    "/reverse": ("nominatim_reverse.json", "application/json"),
+    "/v2/latest": ("openaq_latest.json", "application/json"),
+    "/api/data/TEMPO_NO2_L3_V03": ("tempo_no2.json", "application/json"),
+    "/v1/forecast": ("open_meteo_forecast.json", "application/json"),
+    "/daac-bin/OTF/HTTP_services.cgi": ("gpcp_subset.nc4", "application/x-netcdf"),
+}
+
+PROVIDER_ENV = ("NOMINATIM_URL", "OPENAQ_URL", "GESDISC_URL", "OPEN_METEO_URL", "GPM_URL")
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.bodies = {prefix: open(os.path.join(FIXTURES, name), "rb").read() for prefix, (name, _) in ROUTES.items()}
+        self.hits = {prefix: 0 for prefix in ROUTES}
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="stub-server", daemon=True).start()
+        return self
+
+    def environ(self):
+        """Env vars that send every provider to this server."""
+        return {name: self.url for name in PROVIDER_ENV}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        prefix = next((p for p in ROUTES if self.path.startswith(p)), None)
+        with server._lock:
+            delay = server.latency + server.random.uniform(0, server.jitter)
+            failed = server.random.random() < server.failure_rate
+            if prefix:
+                server.hits[prefix] += 1
+            if failed:
+                server.failures += 1
+        time.sleep(delay / 1000)
+
+        if prefix is None:
+            self._reply(404, b'{"error": "no fixture"}', "application/json")
+        elif failed:
+            self._reply(503, b'{"error": "injected failure"}', "application/json")
+        else:
+            self._reply(200, server.bodies[prefix], ROUTES[prefix][1])
+
+    def _reply(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="ms added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra ms")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction answered with 503")
+    args = parser.parse_args()
+    server = StubServer(args.port, args.latency, args.jitter, args.failure_rate)
+    print(f"stub providers on {server.url}; export " + " ".join(f"{k}={v}" for k, v in server.environ().items()))
+    server.serve_forever()
@@ -0,0 +1,114 @@
+import copy, functools, os, pickle, threading, time
+from collections import OrderedDict
+from metrics import cache_lookup, timed
+
+# Lat/lon are snapped to this grid (degrees) so nearby users share entries
+CACHE_GRID = float(os.getenv("CACHE_GRID", "0.05"))
+
+# Upper bound on the (pickled) size of everything held in the cache
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+def snap(value, grid=None):
+    grid = grid or CACHE_GRID
+    return round(round(float(value) / grid) * grid, 6)
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry expiry and a memory cap."""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, copy.deepcopy(entry[2])
+
+    def set(self, key, value, ttl):
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def expires_in(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[0] - time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+provider_cache = TTLCache()
+
+
+def cached(provider, ttl):
+    """Cache ``fn(lat, lon, *args)`` per provider and grid cell.
+
+    A ``None`` result means the provider had no data and is never stored, so
+    fallbacks are retried on the next request instead of being pinned.
+    """
+    def decorator(fn):
+        def key(lat, lon, *args):
+            return (provider, snap(lat), snap(lon)) + args
+
+        def refresh(lat, lon, *args):
+            # Fetch even if cached, replacing the entry (used by the prefetcher)
+            value = fn(lat, lon, *args)
+            if value is not None:
+                provider_cache.set(key(lat, lon, *args), value, ttl)
+            return value
+
+        @functools.wraps(fn)
+        def wrapper(lat, lon, *args):
+            hit, value = provider_cache.get(key(lat, lon, *args))
+            cache_lookup(provider, hit)
+            if hit:
+                return value
+            with timed(provider):
+                return refresh(lat, lon, *args)
+
+        wrapper.key = key
+        wrapper.refresh = refresh
+        wrapper.ttl = ttl
+        return wrapper
+    return decorator
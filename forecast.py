@@ -0,0 +1,182 @@
+import os, threading, time
+import numpy as np
+from aqi import adjust_for_no2, compute_aqi
+from cache import snap
+from history import HISTORY_HOURLY_DAYS, current_hour, history
+
+# Cells need this many hourly readings before they get their own coefficients;
+# until then they use the model pooled over every cell
+FORECAST_MIN_HOURS = int(os.getenv("FORECAST_MIN_HOURS", "12"))
+FORECAST_RIDGE = float(os.getenv("FORECAST_RIDGE", "2.0"))
+# Full refit from the history store once a day at this UTC hour
+FORECAST_REFIT_HOUR = int(os.getenv("FORECAST_REFIT_HOUR", "2"))
+# How fast today's deviation from the model fades out of the forecast (hours)
+ANOMALY_HOURS = 12.0
+
+# Regressors are centred/scaled around typical values so a missing reading is 0
+WEATHER = (("temp", 25.0, 10.0), ("humidity", 60.0, 30.0), ("wind", 10.0, 10.0))
+N_FEATURES = 5 + len(WEATHER)  # intercept, two diurnal harmonics, weather
+
+_hod = 2 * np.pi * np.arange(24) / 24
+# Seasonal baseline: intercept + daily and half-daily harmonics, per hour of day
+DIURNAL = np.column_stack([np.ones(24), np.sin(_hod), np.cos(_hod), np.sin(2 * _hod), np.cos(2 * _hod)])
+PENALTY = np.diag([0.0] + [1.0] * (N_FEATURES - 1))
+_PAIRS = np.triu_indices(N_FEATURES)
+
+
+def design(hours, temp, humidity, wind):
+    """Feature rows for UTC epoch ``hours`` and their weather (NaN = unknown)."""
+    weather = [np.nan_to_num((np.asarray(v, dtype=float) - centre) / scale)
+               for v, (_, centre, scale) in zip((temp, humidity, wind), WEATHER)]
+    return np.column_stack([DIURNAL[np.asarray(hours) % 24]] + weather)
+
+
+def _solve(xtx, xty):
+    return np.linalg.solve(xtx + FORECAST_RIDGE * PENALTY, xty[..., None])[..., 0]
+
+
+class Forecaster:
+    """Per-cell linear AQI model: diurnal baseline + Open-Meteo weather.
+
+    Each cell keeps the normal equations (XᵀX, Xᵀy) of its hourly history, so
+    ``fit()`` solves every cell in one batched pass and ``observe()`` folds a
+    new hour into one cell and re-solves only that cell. ``daily()`` is a
+    single (hours x features) product for the requested cell.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cells = {}  # (lat, lon) -> row in the arrays below
+        self._xtx = np.zeros((0, N_FEATURES, N_FEATURES))
+        self._xty = np.zeros((0, N_FEATURES))
+        self._n = np.zeros(0, dtype=int)
+        self._last = np.zeros(0, dtype=int)
+        self._coef = np.zeros((0, N_FEATURES))
+        self._sum_xtx, self._sum_xty = np.zeros((N_FEATURES, N_FEATURES)), np.zeros(N_FEATURES)  # all cells
+        self._pooled = None
+        self._fitted = 0.0
+        self._thread = None
+
+    def fit(self, since_hour=None):
+        """Rebuild every cell from the history store."""
+        since_hour = current_hour() - HISTORY_HOURLY_DAYS * 24 if since_hour is None else since_hour
+        rows = history.hourly_since(since_hour, ("aqi", "pm25", "no2", "temp", "humidity", "wind"))
+        if not rows:
+            return 0
+        data = np.array(rows, dtype=float)  # None -> nan
+        lat, lon, hours, aqi, pm25, no2 = data[:, :6].T
+        # Batch lookups only store pollutants; score those hours like /api/aqi does
+        aqi = np.where(np.isnan(aqi), adjust_for_no2(compute_aqi("pm25", pm25), no2), aqi)
+        keep = ~np.isnan(aqi)
+        if not keep.any():
+            return 0
+        lat, lon, hours, aqi, weather = lat[keep], lon[keep], hours[keep].astype(int), aqi[keep], data[keep, 6:]
+
+        cells, index = np.unique(np.column_stack([lat, lon]), axis=0, return_inverse=True)
+        index = index.ravel()
+        x = design(hours, *weather.T)
+        size = len(cells)
+        xtx = np.zeros((size, N_FEATURES, N_FEATURES))
+        for i, j in zip(*_PAIRS):
+            xtx[:, i, j] = xtx[:, j, i] = np.bincount(index, weights=x[:, i] * x[:, j], minlength=size)
+        xty = np.column_stack([np.bincount(index, weights=x[:, i] * aqi, minlength=size) for i in range(N_FEATURES)])
+        n = np.bincount(index, minlength=size)
+        last = np.full(size, np.iinfo(int).min)
+        np.maximum.at(last, index, hours)
+        coef = _solve(xtx, xty)
+
+        with self._lock:
+            self._cells = {(float(a), float(b)): i for i, (a, b) in enumerate(cells)}
+            self._xtx, self._xty, self._n, self._last, self._coef = xtx, xty, n, last, coef
+            self._sum_xtx, self._sum_xty = xtx.sum(axis=0), xty.sum(axis=0)
+            self._pooled = _solve(self._sum_xtx, self._sum_xty)
+            self._fitted = time.time()
+        return size
+
+    def observe(self, lat, lon, hour, aqi, temp=None, humidity=None, wind=None):
+        """Add one new hourly reading; later readings in an hour already seen are ignored."""
+        if aqi is None:
+            return
+        x = design([hour], [_nan(temp)], [_nan(humidity)], [_nan(wind)])[0]
+        key = (snap(lat), snap(lon))
+        with self._lock:
+            i = self._cells.get(key)
+            if i is None:
+                i = self._cells[key] = len(self._n)
+                self._xtx = np.concatenate([self._xtx, np.zeros((1, N_FEATURES, N_FEATURES))])
+                self._xty = np.concatenate([self._xty, np.zeros((1, N_FEATURES))])
+                self._n = np.append(self._n, 0)
+                self._last = np.append(self._last, np.iinfo(int).min)
+                self._coef = np.concatenate([self._coef, np.zeros((1, N_FEATURES))])
+            if hour <= self._last[i]:
+                return
+            outer, target = np.outer(x, x), x * aqi
+            self._xtx[i] += outer
+            self._xty[i] += target
+            self._n[i] += 1
+            self._last[i] = hour
+            self._sum_xtx += outer
+            self._sum_xty += target
+            self._coef[i] = _solve(self._xtx[i], self._xty[i])
+            self._pooled = _solve(self._sum_xtx, self._sum_xty)
+
+    def daily(self, lat, lon, aqi_now, weather_now=None, ahead=None, days=4):
+        """Mean AQI for each of the next ``days`` UTC days as [(day start hour, aqi)].
+
+        ``weather_now`` is the current {temp, humidity, wind}; ``ahead`` holds
+        Open-Meteo's hourly forecast ({"hours": [...], "temp": [...], ...}).
+        """
+        with self._lock:
+            i = self._cells.get((snap(lat), snap(lon)))
+            coef = self._coef[i] if i is not None and self._n[i] >= FORECAST_MIN_HOURS else self._pooled
+
+        now = current_hour()
+        start = (now // 24 + 1) * 24
+        hours = np.arange(start, start + days * 24)
+        if coef is None:
+            return [(int(h), int(aqi_now)) for h in hours[::24]]
+
+        ahead = ahead or {}
+        known = np.asarray(ahead.get("hours", []), dtype=int)
+        slot = np.minimum(np.searchsorted(known, hours), max(len(known) - 1, 0))
+        found = known[slot] == hours if len(known) else np.zeros(len(hours), dtype=bool)
+        columns = [np.where(found, np.asarray(ahead[name], dtype=float)[slot], np.nan)
+                   if len(known) and name in ahead else np.full(len(hours), np.nan) for name, _, _ in WEATHER]
+        now_weather = weather_now or {}
+        x_now = design([now], *[[_nan(now_weather.get(name))] for name, _, _ in WEATHER])
+
+        # Today's deviation from the model persists for a while, then fades
+        anomaly = aqi_now - float((x_now @ coef)[0])
+        predicted = design(hours, *columns) @ coef + anomaly * np.exp(-(hours - now) / ANOMALY_HOURS)
+        by_day = np.clip(predicted.reshape(days, 24).mean(axis=1), 0, 500)
+        return [(int(h), int(round(v))) for h, v in zip(hours[::24], by_day)]
+
+    def start(self):
+        """Fit now, then refit nightly at FORECAST_REFIT_HOUR (UTC)."""
+        if self._thread is not None:
+            return self._thread
+
+        def loop():
+            while True:
+                try:
+                    self.fit()
+                except Exception as e:
+                    print("Forecast refit error:", e)
+                wait = (FORECAST_REFIT_HOUR - time.gmtime().tm_hour - 1) % 24 * 3600 + 3600 - time.time() % 3600
+                time.sleep(wait)
+
+        self._thread = threading.Thread(target=loop, name="forecast-refit", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stats(self):
+        with self._lock:
+            return {"cells": len(self._n), "fitted_cells": int((self._n >= FORECAST_MIN_HOURS).sum()),
+                    "last_refit": round(self._fitted)}
+
+
+def _nan(value):
+    return np.nan if value is None else float(value)
+
+
+forecaster = Forecaster()
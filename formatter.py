@@ -0,0 +1,147 @@
+import re
+
+
+def format_llm_response(text):
+    """Format LLM response for better readability in the frontend"""
+    return _format(text).strip()
+
+
+# One token pattern covering every rewrite the formatter makes, so an answer is
+# scanned once instead of once per rule:
+#   bullet   "-"/"*" plus trailing whitespace        → "• "
+#   para     whitespace with 2+ line breaks           → at most one blank line
+#   list     "12." before whitespace                  → on its own line
+#   stop     ". " before a letter (capital checked)   → blank line after the sentence
+#   warning  IMPORTANT/WARNING/... before ":" or space → **bold**
+#   advice   should/must/... up to the next "."       → **bold** keyword
+# A para that runs straight into a list item is matched together because the
+# list's line break counts towards the blank-line limit.
+_TOKEN_SOURCE = r"""
+    # Every token starts with one of these; checking it first lets the engine
+    # skip ordinary text without trying each alternative
+    (?=[-*\n\d.iwacusmr])
+    (?:
+      (?P<bullet>[-*]\s*)
+    | (?P<para>\n[^\S\n]*(?:\n[^\S\n]*)+)(?P<para_list>\d+\.(?=\s))?
+    | (?P<list>\d+\.(?=\s))
+    | (?P<stop>\.\ (?=[a-z]))
+    | (?P<warning>important|warning|alert|caution|urgent)(?=[:\s]|\d+\.\s)
+    | (?P<advice>should|must|avoid|recommended|advised)(?=\s[^.]+\.|\d+\.\s)
+    )
+"""
+# Case-insensitive matching is several times slower, so ASCII answers (nearly
+# all of them) are scanned lower-cased; anything else falls back to re.I
+_TOKEN = re.compile(_TOKEN_SOURCE, re.VERBOSE)
+_TOKEN_ANY_CASE = re.compile(_TOKEN_SOURCE, re.VERBOSE | re.IGNORECASE)
+
+
+def _paragraph(run, listed):
+    if listed:
+        run += "\n"
+    if run.count("\n") < 3:
+        return run
+    return "\n\n" + run[run.rindex("\n") + 1:]
+
+
+def _format(text):
+    if text.isascii():
+        tokens = _TOKEN.finditer(text.lower())
+    else:
+        tokens = _TOKEN_ANY_CASE.finditer(text)
+    out = []
+    pos = 0
+    advice_end = -1  # recommendations already in bold run up to this index
+    for m in tokens:
+        start, end = m.span()
+        out.append(text[pos:start])
+        kind = m.lastgroup
+
+        if kind == "bullet":
+            out.append("• ")
+        elif kind == "stop":
+            out.append(". \n\n" if "A" <= text[end] <= "Z" else ". ")
+        elif kind == "warning":
+            out.append(f"**{text[start:end]}**")
+        elif kind == "advice":
+            if start < advice_end:
+                out.append(text[start:end])
+            else:
+                out.append(f"**{text[start:end]}**")
+                advice_end = text.index(".", end) + 1
+        else:
+            listed = text[m.start("para_list"):end] if kind == "para_list" else None
+            if kind == "list":
+                out.append("\n")
+                listed = text[start:end]
+            else:
+                out.append(_paragraph(m.group("para"), listed))
+            out.append(listed or "")
+            # A list number ending a sentence still gets the sentence break
+            if listed and text.startswith(" ", end) and "A" <= text[end + 1:end + 2] <= "Z":
+                out.append(" \n\n")
+                end += 1
+        pos = end
+    out.append(text[pos:])
+    return "".join(out)
+
+
+# A recommendation keyword still waiting for the '.' that closes its emphasis
+_OPEN_RECOMMENDATION = re.compile(r'should|must|avoid|recommended|advised', re.IGNORECASE)
+
+
+class StreamFormatter:
+    """Incremental ``format_llm_response`` for streamed completions.
+
+    ``feed()`` returns whatever formatted text is already final and ``finish()``
+    the rest; joined, they equal ``format_llm_response`` of the whole answer.
+    Text is only flushed up to a cut no formatting rule can reach across: just
+    before a character that is neither whitespace nor a digit, which follows
+    either ". " or a newline, with no recommendation keyword since the last '.'.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._held = ""  # trailing whitespace, dropped if the answer ends here
+        self._started = False
+
+    def feed(self, chunk):
+        self._pending += chunk
+        cut = self._last_cut()
+        if cut is None:
+            return ""
+        head, self._pending = self._pending[:cut], self._pending[cut:]
+        if head.endswith(". ") and "A" <= self._pending[0] <= "Z":
+            head += "\n\n"  # the sentence break the full-text pass would insert here
+        return self._emit(_format(head), final=False)
+
+    def finish(self):
+        text, self._pending = self._pending, ""
+        return self._emit(_format(text), final=True)
+
+    def _last_cut(self):
+        text = self._pending
+        for cut in range(len(text) - 1, 0, -1):
+            nxt = text[cut]
+            if nxt.isspace() or nxt.isdigit():
+                continue
+            if text[cut - 1] != "\n" and text[cut - 2:cut] != ". ":
+                continue
+            if _OPEN_RECOMMENDATION.search(text, text.rfind(".", 0, cut) + 1, cut):
+                continue
+            return cut
+        return None
+
+    def _emit(self, text, final):
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._started = True
+        body = text.rstrip()
+        if not body:
+            if not final:
+                self._held += text
+            return ""
+        out = self._held + body
+        self._held = "" if final else text[len(body):]
+        return out
@@ -0,0 +1,252 @@
+import datetime, json, os, tempfile, threading, time
+import netCDF4 as nc
+import numpy as np
+
+# Date-stamped .npy grids plus index.json live here; /tmp is writable on Vercel too
+GRID_STORE_DIR = os.getenv("GRID_STORE_DIR", os.path.join(tempfile.gettempdir(), "igun-grids"))
+GRID_DAYS_KEPT = int(os.getenv("GRID_DAYS_KEPT", "3"))
+GRID_REFRESH_INTERVAL = int(os.getenv("GRID_REFRESH_INTERVAL", str(3 * 3600)))
+# Oldest grid (days before the requested date) still served as that day's
+# reading; older ones count as missing. GPCP daily files are published late,
+# so the refresher also looks back this far for the newest one.
+GRID_MAX_AGE_DAYS = int(os.getenv("GRID_MAX_AGE_DAYS", "1"))
+
+# Full-day source files. TEMPO L3 granules have no stable daily URL, so that
+# product is only refreshed when a template is configured.
+GPCP_GRID_URL = os.getenv(
+    "GPCP_GRID_URL",
+    "https://gpm1.gesdisc.eosdis.nasa.gov/data/GPCP/GPCPDAY/3.3/{year}/gpcp_v03r03_y{year}m{month}d{day}.nc4",
+)
+TEMPO_GRID_URL = os.getenv("TEMPO_GRID_URL")
+
+# Tropospheric NO2 column (molecules/cm²) → surface µg/m³, assuming the column
+# is well mixed through a ~1 km boundary layer
+NO2_COLUMN_TO_SURFACE = 46.0055 / 6.022e23 * 1e6 * 1e6 / 1e5
+
+# How often lookups re-check index.json for grids written by another process
+INDEX_RECHECK_SECONDS = 30
+
+
+class GridStore:
+    """Daily lat/lon grids on local disk, memory-mapped for O(1) point reads.
+
+    Each grid is stored as ``<product>_<YYYYMMDD>.npy`` (float32, rows running
+    south to north) and described in ``index.json`` by its south-west corner
+    and cell size.
+    """
+
+    def __init__(self, root=GRID_STORE_DIR, days_kept=GRID_DAYS_KEPT):
+        self.root = root
+        self.days_kept = days_kept
+        self._lock = threading.Lock()
+        self._index = {}
+        self._index_mtime = None
+        self._checked_at = 0.0
+        self._arrays = {}  # (product, date) -> memmap
+
+    # 🔹 Reads
+    def lookup(self, product, date, lat, lon):
+        grid = self._open(product, date)
+        if grid is None:
+            return None
+        meta, array = grid
+        row = int((float(lat) - meta["lat0"]) // meta["res"])
+        lon_offset = float(lon) - meta["lon0"]
+        if meta["wrap"]:
+            lon_offset %= 360
+        col = int(lon_offset // meta["res"])
+        if not (0 <= row < array.shape[0] and 0 <= col < array.shape[1]):
+            return None
+        value = float(array[row, col])
+        return None if np.isnan(value) else value
+
+    def sample(self, product, date, lats, lons):
+        """Vectorized ``lookup`` over arrays of points; NaN where there is no data."""
+        lats, lons = np.broadcast_arrays(np.asarray(lats, dtype=float), np.asarray(lons, dtype=float))
+        out = np.full(lats.shape, np.nan, dtype=np.float32)
+        grid = self._open(product, date)
+        if grid is None:
+            return out
+        meta, array = grid
+        rows = np.floor((lats - meta["lat0"]) / meta["res"]).astype(int)
+        lon_offset = lons - meta["lon0"]
+        if meta["wrap"]:
+            lon_offset %= 360
+        cols = np.floor(lon_offset / meta["res"]).astype(int)
+        inside = (rows >= 0) & (rows < array.shape[0]) & (cols >= 0) & (cols < array.shape[1])
+        out[inside] = array[rows[inside], cols[inside]]
+        return out
+
+    def days(self, product):
+        self._refresh_index()
+        with self._lock:
+            return sorted(self._index.get(product, {}))
+
+    def latest(self, product, until=None):
+        """Newest stored day, or the newest one on or before ``until`` and no
+        more than GRID_MAX_AGE_DAYS before it."""
+        if until is None:
+            days = self.days(product)
+        else:
+            oldest = (datetime.date.fromisoformat(until) - datetime.timedelta(days=GRID_MAX_AGE_DAYS)).isoformat()
+            days = [day for day in self.days(product) if oldest <= day <= until]
+        return days[-1] if days else None
+
+    # 🔹 Writes
+    def put(self, product, date, grid, lat0, lon0, res):
+        grid = np.asarray(grid, dtype=np.float32)
+        os.makedirs(self.root, exist_ok=True)
+        filename = f"{product}_{date.replace('-', '')}.npy"
+        tmp_path = os.path.join(self.root, f".{filename}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, grid)
+        os.replace(tmp_path, os.path.join(self.root, filename))
+
+        with self._lock:
+            self._read_index()
+            days = self._index.setdefault(product, {})
+            days[date] = {
+                "file": filename,
+                "lat0": float(lat0),
+                "lon0": float(lon0),
+                "res": float(res),
+                "wrap": bool(abs(grid.shape[1] * res - 360) < res),
+            }
+            self._arrays.pop((product, date), None)
+            for stale in sorted(days)[:-self.days_kept]:
+                self._remove(product, stale, days.pop(stale))
+            self._write_index()
+
+    def _remove(self, product, date, meta):
+        self._arrays.pop((product, date), None)
+        try:
+            os.remove(os.path.join(self.root, meta["file"]))
+        except OSError:
+            pass
+
+    # 🔹 Index bookkeeping
+    def _open(self, product, date):
+        self._refresh_index()
+        with self._lock:
+            meta = self._index.get(product, {}).get(date)
+            if meta is None:
+                return None
+            array = self._arrays.get((product, date))
+            if array is None:
+                try:
+                    array = np.load(os.path.join(self.root, meta["file"]), mmap_mode="r")
+                except OSError:
+                    return None
+                self._arrays[(product, date)] = array
+            return meta, array
+
+    def _refresh_index(self):
+        now = time.monotonic()
+        if now - self._checked_at < INDEX_RECHECK_SECONDS:
+            return
+        with self._lock:
+            self._checked_at = now
+            self._read_index()
+
+    def _read_index(self):
+        path = os.path.join(self.root, "index.json")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._index_mtime:
+            return
+        with open(path) as f:
+            self._index = json.load(f)
+        self._index_mtime = mtime
+        self._arrays.clear()
+
+    def _write_index(self):
+        path = os.path.join(self.root, "index.json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+        self._index_mtime = os.stat(path).st_mtime_ns
+
+
+grid_store = GridStore()
+
+
+def grid_from_netcdf(content, variable):
+    """Decode a full lat/lon grid from NetCDF bytes.
+
+    Returns ``(grid, lat0, lon0, res)`` with rows ordered south to north and
+    ``lat0``/``lon0`` at the south-west corner of the first cell. ``variable``
+    may name a group member as ``"group/name"``.
+    """
+    with nc.Dataset("grid.nc4", mode="r", memory=content) as ds:
+        *groups, name = variable.split("/")
+        node = ds
+        for group in groups:
+            node = node.groups[group]
+        values = np.ma.filled(node.variables[name][:].astype(np.float32), np.nan)
+        lats = np.asarray(ds.variables["lat" if "lat" in ds.variables else "latitude"][:], dtype=float)
+        lons = np.asarray(ds.variables["lon" if "lon" in ds.variables else "longitude"][:], dtype=float)
+
+    values = values.reshape(lats.size, lons.size)
+    if lats[0] > lats[-1]:
+        lats, values = lats[::-1], values[::-1]
+    res = float(abs(lats[1] - lats[0])) if lats.size > 1 else 1.0
+    return values, lats[0] - res / 2, lons[0] - res / 2, res
+
+
+# 🔹 Background refresh of the newest published global grids
+def refresh(date=None):
+    """Store the newest grid of each product published on or before ``date``
+    (today), trying up to GRID_MAX_AGE_DAYS back from it."""
+    from http_client import client
+    from providers import EARTHDATA_TOKEN
+
+    date = date or datetime.datetime.utcnow().strftime("%Y-%m-%d")
+    headers = {"Authorization": f"Bearer {EARTHDATA_TOKEN}"}
+    sources = [("gpcp", "gpm", GPCP_GRID_URL, "precip", 1.0)]
+    if TEMPO_GRID_URL:
+        sources.append(("tempo_no2", "gesdisc", TEMPO_GRID_URL,
+                        "product/vertical_column_troposphere", NO2_COLUMN_TO_SURFACE))
+
+    for product, host, template, variable, scale in sources:
+        newest = grid_store.latest(product)
+        day = datetime.date.fromisoformat(date)
+        for _ in range(GRID_MAX_AGE_DAYS + 1):
+            iso = day.isoformat()
+            if newest is not None and iso <= newest:
+                break
+            try:
+                r = client(host).get(template.format(year=f"{day.year:04d}", month=f"{day.month:02d}",
+                                                     day=f"{day.day:02d}", date=iso),
+                                     headers=headers, timeout=(3.05, 120))
+                if r.status_code == 200:
+                    grid, lat0, lon0, res = grid_from_netcdf(r.content, variable)
+                    grid_store.put(product, iso, grid * scale, lat0, lon0, res)
+                    print(f"{product} grid for {iso} stored ({grid.shape[0]}x{grid.shape[1]})")
+                    break
+            except Exception as e:
+                print(f"{product} grid refresh error:", e)
+                break
+            day -= datetime.timedelta(days=1)
+        else:
+            print(f"{product} grid: nothing published in the {GRID_MAX_AGE_DAYS + 1} days up to {date}")
+
+
+_refresher = None
+
+
+def start_refresher(interval=GRID_REFRESH_INTERVAL):
+    global _refresher
+    if _refresher is not None:
+        return _refresher
+
+    def loop():
+        while True:
+            refresh()
+            time.sleep(interval)
+
+    _refresher = threading.Thread(target=loop, name="grid-refresher", daemon=True)
+    _refresher.start()
+    return _refresher
@@ -0,0 +1,164 @@
+import datetime, math, os, struct, zlib
+from concurrent.futures import wait
+import numpy as np
+from aqi import adjust_for_no2, category_codes, compute_aqi
+from cache import TTLCache
+from grid_store import grid_store
+from metrics import timed
+from providers import fetch_region, submit
+from stations import STATION_REGION_DEG, catalog
+
+TILE_SIZE = 256
+# Tiles are rebuilt at most this often; station readings refresh every 15 min
+TILE_TTL = int(os.getenv("TILE_TTL", str(15 * 60)))
+TILE_MAX_PIXELS = 1024 * 1024
+# Station regions a request may fetch before answering; a wider view only
+# uses the regions already loaded
+TILE_MAX_REGIONS = int(os.getenv("TILE_MAX_REGIONS", "9"))
+# How long a request waits for those regions before rendering with the
+# stations already loaded (seconds)
+TILE_STATION_WAIT = float(os.getenv("TILE_STATION_WAIT", "4"))
+# PM2.5 is interpolated at every PM25_STEP-th pixel and filled in bilinearly;
+# the IDW surface is smooth except right at the stations (bench/bench_tiles.py)
+PM25_STEP = 4
+NO_DATA = 0xFFFF  # AQI value of pixels without a PM2.5 estimate in .bin output
+
+LAYERS = ("aqi", "pm25", "no2", "rain")
+FORMATS = ("png", "bin")
+
+# EPA colours for the six AQI categories, then transparent for no data
+PALETTE = bytes([0, 228, 0, 255, 255, 0, 255, 126, 0, 255, 0, 0, 143, 63, 151, 126, 0, 35, 0, 0, 0])
+ALPHA = bytes([170] * 6 + [0])
+
+_tiles = TTLCache(max_bytes=int(os.getenv("TILE_CACHE_BYTES", str(16 * 1024 * 1024))))
+
+
+def tile_axes(z, x, y, size=TILE_SIZE):
+    """Pixel-centre latitudes (north to south) and longitudes of a Web Mercator tile."""
+    n = 2 ** z
+    if not (0 <= z <= 22 and 0 <= x < n and 0 <= y < n):
+        raise ValueError("tile out of range")
+    steps = (np.arange(size) + 0.5) / size
+    lons = (x + steps) / n * 360 - 180
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + steps) / n))))
+    return lats, lons
+
+
+def bbox_axes(bbox, res):
+    """Pixel-centre axes for ``south,west,north,east`` at ``res`` degrees per pixel."""
+    try:
+        south, west, north, east = (float(v) for v in bbox.split(","))
+        res = float(res)
+    except (AttributeError, ValueError):
+        raise ValueError("bbox must be south,west,north,east and res a number of degrees")
+    if not (-90 <= south < north <= 90 and -180 <= west < east <= 180):
+        raise ValueError("bbox must satisfy south < north and west < east within ±90/±180")
+    if not (math.isfinite(res) and res > 0):
+        raise ValueError("res must be a positive number of degrees")
+    rows, cols = math.ceil((north - south) / res), math.ceil((east - west) / res)
+    if rows < 1 or cols < 1:
+        raise ValueError("res is too large for the bbox")
+    if rows * cols > TILE_MAX_PIXELS:
+        raise ValueError(f"{rows}x{cols} pixels; use a coarser res (max {TILE_MAX_PIXELS} pixels)")
+    return north - (np.arange(rows) + 0.5) * res, west + (np.arange(cols) + 0.5) * res
+
+
+def load_stations(lats, lons, timeout=TILE_STATION_WAIT):
+    """Fetch the station regions under the view if there are few enough of them,
+    waiting at most ``timeout``. False if some are still loading."""
+    first = (math.floor(lats.min() / STATION_REGION_DEG), math.floor(lons.min() / STATION_REGION_DEG))
+    last = (math.floor(lats.max() / STATION_REGION_DEG), math.floor(lons.max() / STATION_REGION_DEG))
+    if (last[0] - first[0] + 1) * (last[1] - first[1] + 1) > TILE_MAX_REGIONS:
+        return True
+    regions = [(r, c) for r in range(first[0], last[0] + 1) for c in range(first[1], last[1] + 1)]
+    futures = [submit(catalog.load_region, region, fetch_region) for region in catalog.missing(regions)]
+    # Regions that miss the wait keep loading in the background for later tiles
+    _, pending = wait(futures, timeout=timeout)
+    return not pending
+
+
+def layers(lats, lons, date=None):
+    """Every layer on the lats x lons grid in one batch: PM2.5 interpolated from
+    the stations already in the catalog, TEMPO NO2 and GPCP rain from the
+    newest grids stored up to ``date`` (at most GRID_MAX_AGE_DAYS old)."""
+    date = date or datetime.datetime.utcnow().strftime("%Y-%m-%d")
+    grid_lats, grid_lons = lats[:, None], lons[None, :]
+    rows, cols = _coarse(len(lats)), _coarse(len(lons))
+    pm25 = _bilinear(catalog.grid(lats[rows], lons[cols]), rows, cols, len(lats), len(lons))
+    no2 = grid_store.sample("tempo_no2", grid_store.latest("tempo_no2", date), grid_lats, grid_lons)
+    rain = grid_store.sample("gpcp", grid_store.latest("gpcp", date), grid_lats, grid_lons)
+    aqi = adjust_for_no2(compute_aqi("pm25", pm25), no2)
+    return {"aqi": aqi, "pm25": pm25, "no2": no2, "rain": rain}
+
+
+def _coarse(n):
+    return np.unique(np.r_[np.arange(0, n, PM25_STEP), n - 1])
+
+
+def _bilinear(coarse, rows, cols, height, width):
+    """Expand values sampled at pixel indices ``rows`` x ``cols`` to the full grid."""
+    for axis, (idx, n) in enumerate(((rows, height), (cols, width))):
+        if len(idx) < 2:
+            coarse = np.repeat(coarse, n, axis=axis)
+            continue
+        pos = np.arange(n)
+        lo = np.clip(np.searchsorted(idx, pos, side="right") - 1, 0, len(idx) - 2)
+        frac = ((pos - idx[lo]) / (idx[lo + 1] - idx[lo])).astype(np.float32)
+        frac = frac[:, None] if axis == 0 else frac[None, :]
+        coarse = np.take(coarse, lo, axis=axis) * (1 - frac) + np.take(coarse, lo + 1, axis=axis) * frac
+    return coarse
+
+
+def encode_png(aqi):
+    """Palette PNG, one byte per pixel: the AQI category colour, or transparent."""
+    codes = np.asarray(category_codes(aqi), dtype=np.int16)
+    pixels = np.where((codes < 0) | np.isnan(aqi), 6, codes).astype(np.uint8)
+    height, width = pixels.shape
+    raw = np.zeros((height, width + 1), dtype=np.uint8)  # leading 0 = no row filter
+    raw[:, 1:] = pixels
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0))
+            + chunk(b"PLTE", PALETTE) + chunk(b"tRNS", ALPHA)
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + chunk(b"IEND", b""))
+
+
+def encode_bin(layer, values):
+    """Row-major little-endian array: uint16 AQI (NO_DATA = 65535) or float32 (NaN)."""
+    if layer == "aqi":
+        return np.where(np.isnan(values), NO_DATA, np.clip(np.round(values), 0, 500)).astype("<u2").tobytes(), "uint16"
+    return np.asarray(values, dtype="<f4").tobytes(), "float32"
+
+
+def render_tile(key, lats, lons, layer, fmt):
+    """(body, headers) for one view, from the tile cache when it is fresh."""
+    if layer not in LAYERS or fmt not in FORMATS or (fmt == "png" and layer != "aqi"):
+        raise ValueError(f"layer must be one of {', '.join(LAYERS)} (png is aqi only) and format png or bin")
+    hit, cached = _tiles.get((key, layer, fmt))
+    if hit:
+        return cached
+
+    with timed("tile"):
+        complete = load_stations(lats, lons)
+        values = layers(lats, lons)[layer]
+        if fmt == "png":
+            body, headers = encode_png(values), {"Content-Type": "image/png"}
+        else:
+            body, dtype = encode_bin(layer, values)
+            headers = {"Content-Type": "application/octet-stream", "X-Grid-Shape": f"{len(lats)},{len(lons)}",
+                       "X-Grid-Dtype": dtype, "X-Grid-Lat": f"{lats[0]:.6f},{lats[-1]:.6f}",
+                       "X-Grid-Lon": f"{lons[0]:.6f},{lons[-1]:.6f}"}
+    if not complete:
+        # Rendered without some stations; the next request gets the full tile
+        headers["Cache-Control"] = "no-cache"
+        return body, headers
+    headers["Cache-Control"] = f"public, max-age={TILE_TTL}"
+    _tiles.set((key, layer, fmt), (body, headers), TILE_TTL)
+    return body, headers
+
+
+def tile_stats():
+    return _tiles.stats()
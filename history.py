@@ -0,0 +1,157 @@
+import os, sqlite3, tempfile, threading, time
+from cache import snap
+
+# SQLite file holding every real reading per grid cell
+HISTORY_DB = os.getenv("HISTORY_DB", os.path.join(tempfile.gettempdir(), "igun-history.sqlite3"))
+
+# Hourly rows are kept this many days, then averaged into one row per day;
+# daily rows are dropped after HISTORY_DAILY_DAYS
+HISTORY_HOURLY_DAYS = int(os.getenv("HISTORY_HOURLY_DAYS", "7"))
+HISTORY_DAILY_DAYS = int(os.getenv("HISTORY_DAILY_DAYS", "365"))
+HISTORY_COMPACT_INTERVAL = 3600
+
+# How far back the dashboard charts look
+HISTORY_CHART_HOURS = int(os.getenv("HISTORY_CHART_HOURS", "12"))
+
+FIELDS = ("pm25", "no2", "aqi", "temp", "humidity", "wind", "rainfall")
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS hourly (
+    lat REAL NOT NULL, lon REAL NOT NULL, hour INTEGER NOT NULL,
+    {", ".join(f"{f} REAL" for f in FIELDS)},
+    PRIMARY KEY (lat, lon, hour)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily (
+    lat REAL NOT NULL, lon REAL NOT NULL, day INTEGER NOT NULL,
+    {", ".join(f"{f} REAL" for f in FIELDS)},
+    hours INTEGER NOT NULL,
+    PRIMARY KEY (lat, lon, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS hourly_by_hour ON hourly (hour);
+"""
+
+# A later reading in the same hour replaces the earlier one field by field
+_UPSERT = (
+    f"INSERT INTO hourly (lat, lon, hour, {', '.join(FIELDS)}) VALUES (?, ?, ?{', ?' * len(FIELDS)}) "
+    "ON CONFLICT (lat, lon, hour) DO UPDATE SET "
+    + ", ".join(f"{f} = COALESCE(excluded.{f}, {f})" for f in FIELDS)
+)
+
+
+def current_hour():
+    return int(time.time() // 3600)
+
+
+class HistoryStore:
+    """Hourly readings per grid cell in SQLite, range-queried for the charts.
+
+    Cells are snapped like the provider cache. ``compact()`` (run at most
+    hourly from ``record``) rolls hourly rows older than ``hourly_days`` into
+    daily averages and drops daily rows older than ``daily_days``, so the
+    file grows with the number of cells, not with time.
+    """
+
+    def __init__(self, path=HISTORY_DB, hourly_days=HISTORY_HOURLY_DAYS, daily_days=HISTORY_DAILY_DAYS):
+        self.path = path
+        self.hourly_days = hourly_days
+        self.daily_days = daily_days
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._compacted = 0.0
+
+    def record(self, lat, lon, hour=None, **values):
+        """Store one reading; fields left out or None keep what the hour had."""
+        self.record_many([(lat, lon, current_hour() if hour is None else hour, values)])
+
+    def record_many(self, rows):
+        params = [(snap(lat), snap(lon), int(hour)) + tuple(values.get(f) for f in FIELDS)
+                  for lat, lon, hour, values in rows
+                  if any(values.get(f) is not None for f in FIELDS)]
+        if not params:
+            return
+        try:
+            with self._write_lock, self._conn() as conn:
+                conn.executemany(_UPSERT, params)
+        except sqlite3.Error as e:
+            print("History write error:", e)
+        if time.monotonic() - self._compacted > HISTORY_COMPACT_INTERVAL:
+            self._compacted = time.monotonic()
+            threading.Thread(target=self.compact, name="history-compact", daemon=True).start()
+
+    def series(self, lat, lon, hours=24, until=None):
+        """Readings from the last ``hours`` hours: {"hour": [...], field: [...]}."""
+        until = current_hour() if until is None else until
+        rows = self._query(
+            f"SELECT hour, {', '.join(FIELDS)} FROM hourly WHERE lat = ? AND lon = ? AND hour > ? AND hour <= ? "
+            "ORDER BY hour", (snap(lat), snap(lon), until - hours, until))
+        return _columns(("hour",) + FIELDS, rows)
+
+    def daily(self, lat, lon, days=30):
+        today = current_hour() // 24
+        rows = self._query(
+            f"SELECT day, {', '.join(FIELDS)} FROM daily WHERE lat = ? AND lon = ? AND day > ? ORDER BY day",
+            (snap(lat), snap(lon), today - days))
+        return _columns(("day",) + FIELDS, rows)
+
+    def hourly_since(self, since_hour, fields=FIELDS):
+        """Every cell's hourly rows after ``since_hour`` as (lat, lon, hour, *fields)."""
+        return self._query(f"SELECT lat, lon, hour, {', '.join(fields)} FROM hourly WHERE hour > ?", (since_hour,))
+
+    def compact(self, now_hour=None):
+        now_hour = current_hour() if now_hour is None else now_hour
+        cutoff = (now_hour // 24 - self.hourly_days) * 24  # whole days only
+        averages = ", ".join(f"AVG({f})" for f in FIELDS)
+        try:
+            with self._write_lock, self._conn() as conn:
+                conn.execute(
+                    f"INSERT INTO daily (lat, lon, day, {', '.join(FIELDS)}, hours) "
+                    f"SELECT lat, lon, hour / 24, {averages}, COUNT(*) FROM hourly WHERE hour < ? "
+                    "GROUP BY lat, lon, hour / 24 "
+                    "ON CONFLICT (lat, lon, day) DO UPDATE SET "
+                    + ", ".join(f"{f} = COALESCE(excluded.{f}, {f})" for f in FIELDS)
+                    + ", hours = hours + excluded.hours", (cutoff,))
+                conn.execute("DELETE FROM hourly WHERE hour < ?", (cutoff,))
+                conn.execute("DELETE FROM daily WHERE day < ?", (cutoff // 24 - self.daily_days,))
+        except sqlite3.Error as e:
+            print("History compaction error:", e)
+
+    def stats(self):
+        (hourly,), = self._query("SELECT COUNT(*) FROM hourly", ())
+        (daily,), = self._query("SELECT COUNT(*) FROM daily", ())
+        (cells,), = self._query("SELECT COUNT(*) FROM (SELECT DISTINCT lat, lon FROM hourly)", ())
+        return {"hourly_rows": hourly, "daily_rows": daily, "cells": cells}
+
+    def _query(self, sql, params):
+        try:
+            return self._conn().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print("History read error:", e)
+            return []
+
+    def _conn(self):
+        # One connection per thread; WAL lets readers run alongside the writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+
+def chart(series, field, current):
+    """(labels, values) for one field of ``series``, skipping hours without a
+    reading; a cell with no history yet charts just the current value."""
+    points = [(hour, value) for hour, value in zip(series["hour"], series[field]) if value is not None]
+    if not points:
+        points = [(current_hour(), current)]
+    labels = [time.strftime("%H:00 UTC", time.gmtime(hour * 3600)) for hour, _ in points]
+    return labels, [round(value, 2) for _, value in points]
+
+
+def _columns(names, rows):
+    return {name: [row[i] for row in rows] for i, name in enumerate(names)}
+
+
+history = HistoryStore()
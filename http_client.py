@@ -0,0 +1,226 @@
+import asyncio, contextlib, contextvars, os, random, threading, time
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# (connect, read) seconds, used when a caller does not pass its own timeout
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# Transient statuses worth another attempt
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Connections per provider for aget(); an event loop can hold far more requests
+# in flight than a thread pool, so this is well above HTTP_POOL_SIZE
+ASYNC_POOL_SIZE = int(os.getenv("ASYNC_POOL_SIZE", "100"))
+
+# Threads one provider may hold in get() at once, well below PROVIDER_WORKERS
+# so a provider that hangs can't take the pool from the others; a call that
+# finds no free slot within PROVIDER_SLOT_WAIT fails instead of queueing
+PROVIDER_MAX_INFLIGHT = int(os.getenv("PROVIDER_MAX_INFLIGHT", "6"))
+PROVIDER_SLOT_WAIT = 0.5
+
+# Monotonic time by which the current fetch_all() needs its answers; get()
+# trims its timeouts to it and skips retries that can't finish in time
+_deadline = contextvars.ContextVar("provider_deadline", default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Bound every provider call made in this context (and in tasks or pool
+    threads started from it) to ``seconds`` from now."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _remaining(end):
+    return None if end is None else end - time.monotonic()
+
+
+def _trim(timeout, end):
+    """``timeout`` cut down to the time left before ``end``; None once it has passed."""
+    remaining = _remaining(end)
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        return None
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    return (min(connect, remaining), min(read, remaining))
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling a provider that is cooling down."""
+
+
+class ProviderBusyError(requests.RequestException):
+    """Raised instead of queueing behind a provider's in-flight requests."""
+
+
+class ProviderClient:
+    """Pooled keep-alive session for one provider host.
+
+    Transient failures are retried with jittered exponential backoff, within
+    the caller's ``deadline()`` if it set one. After ``failure_threshold``
+    consecutive failed calls the provider is skipped for ``cooldown`` seconds,
+    then a single trial request is let through.
+    """
+
+    def __init__(self, name, timeout=DEFAULT_TIMEOUT, pool_size=10, retries=2,
+                 backoff=0.3, failure_threshold=5, cooldown=60, headers=None,
+                 max_inflight=PROVIDER_MAX_INFLIGHT):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.pool_size = pool_size
+        self.max_inflight = max_inflight
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              pool_block=True, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"User-Agent": "IGUN-Air-App"})
+        self.session.headers.update(headers or {})
+
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+        self._trial_in_flight = False
+        self._async = None  # (event loop, httpx.AsyncClient)
+        self._slots = threading.BoundedSemaphore(max_inflight)
+
+    def get(self, url, **kwargs):
+        end = _deadline.get()
+        if end is not None and end <= time.monotonic():
+            raise requests.Timeout(f"{self.name}: deadline passed before the request")
+        wait = PROVIDER_SLOT_WAIT if end is None else min(PROVIDER_SLOT_WAIT, _remaining(end))
+        if not self._slots.acquire(timeout=max(wait, 0)):
+            raise ProviderBusyError(f"{self.name} has {self.max_inflight} requests in flight, skipping request")
+        try:
+            return self._get(url, end, **kwargs)
+        finally:
+            self._slots.release()
+
+    def _get(self, url, end, **kwargs):
+        self._before_call()
+        timeout = kwargs.pop("timeout", self.timeout)
+        response, error = None, None
+        for attempt in range(self.retries + 1):
+            if attempt and not self._pause(attempt, end):
+                break
+            attempt_timeout = _trim(timeout, end)
+            if attempt_timeout is None:
+                break
+            try:
+                response, error = self.session.get(url, timeout=attempt_timeout, **kwargs), None
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response, error = None, e
+                continue
+            except Exception:
+                self._record(success=False)
+                raise
+            if response.status_code not in RETRY_STATUSES:
+                self._record(success=True)
+                return response
+
+        return self._give_up(response, error)
+
+    async def aget(self, url, **kwargs):
+        """``get()`` for the ASGI app: same retries and circuit breaker, but
+        the request waits on the running event loop instead of a thread, so
+        it needs no in-flight cap or deadline (stragglers just fill the cache)."""
+        self._before_call()
+        timeout = kwargs.pop("timeout", self.timeout)
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        kwargs["timeout"] = httpx.Timeout(read, connect=connect, pool=None)
+        session = self._async_session()
+        response, error = None, None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+            try:
+                response, error = await session.get(url, **kwargs), None
+            except httpx.TransportError as e:
+                response, error = None, e
+                continue
+            except Exception:
+                self._record(success=False)
+                raise
+            if response.status_code not in RETRY_STATUSES:
+                self._record(success=True)
+                return response
+
+        return self._give_up(response, error)
+
+    def state(self):
+        with self._lock:
+            if self._open_until > time.monotonic():
+                return "open"
+            return "half-open" if self._failures >= self.failure_threshold else "closed"
+
+    def _pause(self, attempt, end):
+        """Back off before retry ``attempt``; False (without sleeping) when the
+        retry could not finish before ``end``."""
+        pause = self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+        remaining = _remaining(end)
+        if remaining is not None and pause >= remaining:
+            return False
+        time.sleep(pause)
+        return True
+
+    def _give_up(self, response, error):
+        self._record(success=False)
+        if error is not None:
+            raise error
+        if response is None:
+            raise requests.Timeout(f"{self.name}: deadline passed before a response")
+        return response
+
+    def _before_call(self):
+        with self._lock:
+            if self._failures < self.failure_threshold:
+                return
+            if self._open_until > time.monotonic() or self._trial_in_flight:
+                raise CircuitOpenError(f"{self.name} circuit open, skipping request")
+            self._trial_in_flight = True
+
+    def _async_session(self):
+        # httpx clients belong to the loop they were first used on
+        loop = asyncio.get_running_loop()
+        if self._async is None or self._async[0] is not loop:
+            limits = httpx.Limits(max_connections=ASYNC_POOL_SIZE,
+                                  max_keepalive_connections=self.pool_size)
+            self._async = (loop, httpx.AsyncClient(headers=dict(self.session.headers), limits=limits,
+                                                   follow_redirects=True))
+        return self._async[1]
+
+    def _record(self, success):
+        with self._lock:
+            self._trial_in_flight = False
+            if success:
+                self._failures = 0
+                return
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._open_until = time.monotonic() + self.cooldown
+                print(f"{self.name} failing repeatedly, skipping it for {self.cooldown}s")
+
+
+_pool_size = int(os.getenv("HTTP_POOL_SIZE", "10"))
+
+CLIENTS = {
+    "nominatim": ProviderClient("nominatim", pool_size=_pool_size),
+    "openaq": ProviderClient("openaq", pool_size=_pool_size),
+    "gesdisc": ProviderClient("gesdisc", pool_size=_pool_size),
+    "open-meteo": ProviderClient("open-meteo", timeout=(3.05, 15), pool_size=_pool_size),
+    "gpm": ProviderClient("gpm", timeout=(3.05, 30), pool_size=_pool_size),
+}
+
+
+def client(name):
+    return CLIENTS[name]
@@ -0,0 +1,170 @@
+import math, os, re, threading, time
+from collections import Counter, OrderedDict
+from cache import TTLCache
+
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(30 * 60)))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+
+# Cosine similarity of character trigrams needed for a rephrased question to
+# reuse an answer (e.g. 0.8). Off by default: only exact questions hit
+LLM_CACHE_SIMILARITY = float(os.getenv("LLM_CACHE_SIMILARITY", "0"))
+
+# Questions remembered per (city, AQI class, weather band) for similarity
+# search, and how many such contexts are kept (least recently used go first)
+QUESTIONS_PER_CONTEXT = 64
+LLM_CACHE_CONTEXTS = int(os.getenv("LLM_CACHE_CONTEXTS", "256"))
+# How often set() sweeps questions whose answers have expired out of the index
+INDEX_SWEEP_SECONDS = 60
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+# Words that don't change what a question asks; everything else must match
+_FILLER = frozenset("a an the is it its are am be to for of in on at me my i we you can could should "
+                    "would do does will please".split())
+
+
+def normalize_question(question):
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", question.lower())).strip()
+
+
+def weather_band(weather):
+    temp = weather.get("temp", 20)
+    rainfall = weather.get("rainfall") or 0
+    return (
+        "cold" if temp < 10 else "mild" if temp < 25 else "hot",
+        "wet" if rainfall >= 2 else "dry",
+        "windy" if weather.get("wind", 0) > 20 else "calm",
+    )
+
+
+def context_key(snapshot):
+    weather = dict(snapshot["weather"], rainfall=snapshot.get("rainfall"))
+    return (snapshot["city"], snapshot["classification"]) + weather_band(weather)
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _content_words(text):
+    return frozenset(text.split()) - _FILLER
+
+
+def _cosine(a, b):
+    dot = sum(count * b.get(gram, 0) for gram, count in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values()) * sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+class AnswerCache:
+    """Formatted chat answers keyed on question + location context.
+
+    Exact matches use the normalized question. When ``similarity`` is set, a
+    question in the same context with the same content words and a
+    character-trigram cosine of at least ``similarity`` also matches, so
+    reworded questions ("is the air safe for kids today?" / "is the air today
+    safe for kids?") reuse the answer while "open" / "close the windows" or
+    "today" / "tomorrow" do not.
+    """
+
+    def __init__(self, ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_BYTES, similarity=LLM_CACHE_SIMILARITY):
+        self.ttl = ttl
+        self.similarity = similarity
+        self._answers = TTLCache(max_bytes=max_bytes)
+        # context -> OrderedDict(question -> (expires_at, content words, trigrams)),
+        # only filled when the similarity match is on
+        self._questions = OrderedDict()
+        self._swept = time.monotonic()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def get(self, question, snapshot):
+        question = normalize_question(question)
+        context = context_key(snapshot)
+        hit, answer = self._answers.get(context + (question,))
+        if hit:
+            return self._count("exact_hits", answer)
+        if self.similarity > 0:
+            match = self._most_similar(context, question)
+            if match is not None:
+                hit, answer = self._answers.get(context + (match,))
+                if hit:
+                    return self._count("similar_hits", answer)
+                self._forget(context, match)
+        return self._count("misses", None)
+
+    def set(self, question, snapshot, answer):
+        question = normalize_question(question)
+        context = context_key(snapshot)
+        self._answers.set(context + (question,), answer, self.ttl)
+        if self.similarity <= 0:
+            return
+        now = time.monotonic()
+        entry = (now + self.ttl, _content_words(question), _trigrams(question))
+        with self._lock:
+            questions = self._questions.setdefault(context, OrderedDict())
+            self._questions.move_to_end(context)
+            questions[question] = entry
+            questions.move_to_end(question)
+            while len(questions) > QUESTIONS_PER_CONTEXT:
+                questions.popitem(last=False)
+            while len(self._questions) > LLM_CACHE_CONTEXTS:
+                self._questions.popitem(last=False)
+            if now - self._swept >= INDEX_SWEEP_SECONDS:
+                self._sweep(now)
+
+    def stats(self):
+        with self._lock:
+            total = self.exact_hits + self.similar_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.exact_hits + self.similar_hits) / total, 4) if total else 0.0,
+                "entries": self._answers.stats()["entries"],
+            }
+
+    def _most_similar(self, context, question):
+        words, grams = _content_words(question), _trigrams(question)
+        now = time.monotonic()
+        with self._lock:
+            candidates = list(self._questions.get(context, {}).items())
+            if candidates:
+                self._questions.move_to_end(context)
+        best, best_score = None, self.similarity
+        for candidate, (expires_at, candidate_words, candidate_grams) in candidates:
+            if expires_at < now or candidate_words != words:
+                continue
+            score = _cosine(grams, candidate_grams)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def _forget(self, context, question):
+        with self._lock:
+            questions = self._questions.get(context)
+            if questions is not None:
+                questions.pop(question, None)
+                if not questions:
+                    del self._questions[context]
+
+    def _sweep(self, now):
+        # Called with the lock held
+        self._swept = now
+        for context in list(self._questions):
+            questions = self._questions[context]
+            for question in [q for q, entry in questions.items() if entry[0] < now]:
+                del questions[question]
+            if not questions:
+                del self._questions[context]
+
+    def _count(self, counter, answer):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        return answer
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,187 @@
+import contextvars, json, os, threading, time
+from contextlib import contextmanager
+
+# Histogram buckets (seconds) for request and stage timings
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# One JSON line per request on stdout, next to the existing print() output
+REQUEST_LOG = os.getenv("REQUEST_LOG", "1") == "1"
+
+METRICS = {
+    "igun_requests_total": ("counter", "HTTP requests by route and status"),
+    "igun_request_seconds": ("histogram", "HTTP request duration by route"),
+    "igun_stage_seconds": ("histogram", "Time spent in each pipeline stage"),
+    "igun_fallbacks_total": ("counter", "Provider results replaced by a fallback, by reason"),
+    "igun_cache_requests_total": ("counter", "Provider cache lookups by result"),
+}
+
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [count per bucket..., +Inf count, sum]
+_collectors = []
+
+# The request being served, if any; provider threads see it through copy_context()
+_current = contextvars.ContextVar("igun_request", default=None)
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, seconds, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        buckets = _histograms.setdefault(key, [0] * (len(BUCKETS) + 2))
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                buckets[i] += 1
+        buckets[-2] += 1
+        buckets[-1] += seconds
+
+
+@contextmanager
+def timed(stage):
+    """Record how long the block takes under ``igun_stage_seconds{stage=...}``
+    and in the current request's log line."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("igun_stage_seconds", elapsed, stage=stage)
+        record = _current.get()
+        if record is not None:
+            with _lock:
+                record["stages"][stage] = record["stages"].get(stage, 0.0) + elapsed
+
+
+def fallback(provider, reason):
+    inc("igun_fallbacks_total", provider=provider, reason=reason)
+    record = _current.get()
+    if record is not None:
+        with _lock:
+            record["fallbacks"].append(f"{provider}:{reason}")
+
+
+def cache_lookup(cache, hit):
+    result = "hit" if hit else "miss"
+    inc("igun_cache_requests_total", cache=cache, result=result)
+    record = _current.get()
+    if record is not None:
+        with _lock:
+            record["cache"][result] += 1
+
+
+def start_request():
+    """Begin a request record unless one is already active (the ASGI layer
+    starts it before Flask). Returns a token for ``finish_request``."""
+    if _current.get() is not None:
+        return None
+    return _current.set({"start": time.perf_counter(), "stages": {}, "fallbacks": [],
+                         "cache": {"hit": 0, "miss": 0}})
+
+
+def finish_request(method, route, path, status, token=None):
+    record = _current.get()
+    if record is None:
+        return
+    elapsed = time.perf_counter() - record["start"]
+    inc("igun_requests_total", route=route, method=method, status=str(status))
+    observe("igun_request_seconds", elapsed, route=route)
+    if REQUEST_LOG:
+        with _lock:
+            line = {
+                "event": "request",
+                "method": method,
+                "path": path,
+                "route": route,
+                "status": status,
+                "ms": round(elapsed * 1000, 1),
+                "stages_ms": {stage: round(s * 1000, 1) for stage, s in record["stages"].items()},
+                "fallbacks": list(record["fallbacks"]),
+                "cache": dict(record["cache"]),
+            }
+        print(json.dumps(line))
+    reset_request(token)
+
+
+def streamed(body, finish):
+    """Iterate a streamed response body in the context of the request that
+    created it, then call ``finish()`` once the last chunk is out (or the
+    client goes away), so spans timed while streaming reach its log line."""
+    context = contextvars.copy_context()
+    chunks = iter(body)
+
+    def run():
+        try:
+            while True:
+                chunk = context.run(next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            if hasattr(chunks, "close"):
+                context.run(chunks.close)
+            context.run(finish)
+
+    return run()
+
+
+def reset_request(token):
+    if token is not None:
+        _current.reset(token)
+
+
+def collector(fn):
+    """Register ``fn() -> [(name, labels, value), ...]`` as gauges read at scrape time."""
+    _collectors.append(fn)
+    return fn
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+
+def render():
+    """Everything in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(value) for key, value in _histograms.items()}
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            continue
+        for (metric, labels), buckets in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(BUCKETS, buckets):
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {buckets[-2]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {buckets[-2]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {round(buckets[-1], 6)}")
+
+    gauges = {}
+    for fn in _collectors:
+        try:
+            for name, labels, value in fn():
+                gauges.setdefault(name, []).append((_labels(labels), value))
+        except Exception as e:
+            print("Metrics collector error:", e)
+    for name, samples in gauges.items():
+        lines.append(f"# TYPE {name} gauge")
+        lines += [f"{name}{_format_labels(labels)} {value}" for labels, value in samples]
+    return "\n".join(lines) + "\n"
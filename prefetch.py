@@ -0,0 +1,182 @@
+import datetime, heapq, math, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from cache import provider_cache, snap
+from http_client import client
+from providers import reverse_geocode, tempo_no2, open_meteo, gpcp_precip
+
+# How many of the most requested grid cells are kept warm
+PREFETCH_TOP_K = int(os.getenv("PREFETCH_TOP_K", "30"))
+
+# Seconds between scans; cached entries expiring within PREFETCH_LEAD are refetched
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "30"))
+PREFETCH_LEAD = float(os.getenv("PREFETCH_LEAD", str(2 * 60)))
+
+# Upstream calls in flight at once across all providers
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))
+
+# Request counts halve over this many seconds so an old spike stops counting
+PREFETCH_HALF_LIFE = float(os.getenv("PREFETCH_HALF_LIFE", str(6 * 3600)))
+
+# A provider that came back empty for a cell is not retried before this
+PREFETCH_RETRY = 5 * 60
+MAX_TRACKED_CELLS = 5000
+
+# Minimum seconds between prefetch calls per provider; Nominatim's usage
+# policy allows one request a second, the others stay well under their quotas
+PREFETCH_SPACING = {
+    "geocode": 1.0,
+    "tempo": 0.5,
+    "weather": 0.2,
+    "gpcp": 1.0,
+}
+
+# Cached fetcher per provider, and the HTTP client whose circuit breaker gates it
+PREFETCH_PROVIDERS = {
+    "geocode": (reverse_geocode, "nominatim"),
+    "tempo": (tempo_no2, "gesdisc"),
+    "weather": (open_meteo, "open-meteo"),
+    "gpcp": (gpcp_precip, "gpm"),
+}
+
+
+class _Spacing:
+    """Hands out call slots at least ``interval`` seconds apart."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        time.sleep(slot - now)
+
+
+class Prefetcher:
+    """Keeps the provider caches of the busiest grid cells warm.
+
+    ``record()`` counts a request for a cell. Every ``interval`` seconds the
+    ``top_k`` cells by (decaying) count have each provider entry that is
+    missing or expires within ``lead`` seconds refetched in the background,
+    so their next page load is served from cache.
+    """
+
+    def __init__(self, top_k=PREFETCH_TOP_K, interval=PREFETCH_INTERVAL, lead=PREFETCH_LEAD,
+                 workers=PREFETCH_WORKERS, half_life=PREFETCH_HALF_LIFE):
+        self.top_k = top_k
+        self.interval = interval
+        self.lead = lead
+        self.half_life = half_life
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._spacing = {name: _Spacing(s) for name, s in PREFETCH_SPACING.items()}
+        self._lock = threading.Lock()
+        self._counts = {}  # cell -> (score, monotonic time of last update)
+        self._in_flight = set()
+        self._attempted = {}  # cache key -> monotonic time of last refetch
+        self._thread = None
+        self.refreshed = 0
+        self.empty = 0
+        self.skipped = 0
+
+    def record(self, lat, lon):
+        try:
+            cell = (snap(lat), snap(lon))
+        except (TypeError, ValueError):
+            return
+        now = time.monotonic()
+        with self._lock:
+            score, updated = self._counts.get(cell, (0.0, now))
+            self._counts[cell] = (self._decay(score, now - updated) + 1, now)
+            if len(self._counts) > MAX_TRACKED_CELLS:
+                scored = [(self._decay(s, now - u), c) for c, (s, u) in self._counts.items()]
+                for _, stale in heapq.nsmallest(len(scored) - MAX_TRACKED_CELLS, scored):
+                    del self._counts[stale]
+
+    def top_cells(self, k=None):
+        now = time.monotonic()
+        with self._lock:
+            scored = [(self._decay(s, now - u), cell) for cell, (s, u) in self._counts.items()]
+        return [cell for _, cell in heapq.nlargest(k or self.top_k, scored)]
+
+    def due(self):
+        """(provider, cell, extra args, cache key) for every entry to refetch now."""
+        date = datetime.datetime.utcnow().strftime("%Y-%m-%d")
+        now = time.monotonic()
+        for cell in self.top_cells():
+            for name, (fetcher, _) in PREFETCH_PROVIDERS.items():
+                args = (date,) if name == "gpcp" else ()
+                key = fetcher.key(*cell, *args)
+                remaining = provider_cache.expires_in(key)
+                if remaining is not None and remaining > self.lead:
+                    continue
+                if remaining is None and now - self._attempted.get(key, -math.inf) < PREFETCH_RETRY:
+                    continue
+                yield name, cell, args, key
+
+    def run_once(self):
+        now = time.monotonic()
+        submitted = 0
+        for name, cell, args, key in list(self.due()):
+            with self._lock:
+                if key in self._in_flight:
+                    continue
+                self._in_flight.add(key)
+                self._attempted[key] = now
+            self._pool.submit(self._refresh, name, cell, args, key)
+            submitted += 1
+        with self._lock:
+            for key in [k for k, t in self._attempted.items() if now - t > PREFETCH_RETRY]:
+                del self._attempted[key]
+        return submitted
+
+    def start(self):
+        if self._thread is not None:
+            return self._thread
+
+        def loop():
+            while True:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    print("Prefetch error:", e)
+                time.sleep(self.interval)
+
+        self._thread = threading.Thread(target=loop, name="prefetcher", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tracked_cells": len(self._counts),
+                "in_flight": len(self._in_flight),
+                "refreshed": self.refreshed,
+                "empty": self.empty,
+                "skipped": self.skipped,
+            }
+
+    def _refresh(self, name, cell, args, key):
+        fetcher, client_name = PREFETCH_PROVIDERS[name]
+        outcome = "empty"
+        try:
+            if client(client_name).state() == "open":
+                outcome = "skipped"
+                return
+            self._spacing[name].wait()
+            if fetcher.refresh(*cell, *args) is not None:
+                outcome = "refreshed"
+        except Exception as e:
+            print(f"Prefetch {name} error:", e)
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+                setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def _decay(self, score, elapsed):
+        return score * 0.5 ** (elapsed / self.half_life)
+
+
+prefetcher = Prefetcher()
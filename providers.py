@@ -0,0 +1,446 @@
+import contextvars, datetime, math, random, os, threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import netCDF4 as nc
+import numpy as np
+from cache import cached
+from http_client import client, deadline as http_deadline
+from grid_store import grid_store
+from metrics import fallback, timed
+from stations import catalog, parse_stations, region_url
+
+EARTHDATA_TOKEN = os.getenv("EARTHDATA_TOKEN")
+
+# Overall wall-clock budget for the dashboard fetch stage (seconds)
+PROVIDER_DEADLINE = float(os.getenv("PROVIDER_DEADLINE", "12"))
+
+# Shared pool so a page load costs the slowest provider, not the sum of all five
+_provider_pool = ThreadPoolExecutor(max_workers=int(os.getenv("PROVIDER_WORKERS", "20")),
+                                    thread_name_prefix="provider")
+
+
+def submit(fn, *args, pool=None):
+    # Carry the caller's context so timings land in its request log line
+    return (pool or _provider_pool).submit(contextvars.copy_context().run, fn, *args)
+
+
+# Upstream base URLs by client name; NOMINATIM_URL, OPEN_METEO_URL etc. point
+# them elsewhere, e.g. at the offline bench's stub server
+PROVIDER_URLS = {
+    name: os.getenv(name.upper().replace("-", "_") + "_URL", default).rstrip("/")
+    for name, default in {
+        "nominatim": "https://nominatim.openstreetmap.org",
+        "openaq": "https://api.openaq.org",
+        "gesdisc": "https://disc.gsfc.nasa.gov",
+        "open-meteo": "https://api.open-meteo.com",
+        "gpm": "https://gpm1.gesdisc.eosdis.nasa.gov",
+    }.items()
+}
+
+
+# Per-provider cache lifetimes (seconds)
+PROVIDER_TTLS = {
+    "geocode": 3 * 24 * 3600,
+    "tempo": 60 * 60,
+    "weather": 10 * 60,
+    "gpcp": 24 * 3600,
+}
+
+
+# Each provider is a URL builder plus a response parser, shared by the cached
+# fetchers below and their async twins in async_providers.py
+
+# 🔹 Helper: reverse geocode (lat → city name)
+def geocode_url(lat, lon):
+    return f"{PROVIDER_URLS['nominatim']}/reverse?format=json&lat={lat}&lon={lon}"
+
+
+def parse_geocode(r):
+    if r.status_code == 200:
+        data = r.json()
+        city = data.get("address", {}).get("city") or \
+               data.get("address", {}).get("town") or \
+               data.get("address", {}).get("village") or \
+               data.get("address", {}).get("county")
+        country = data.get("address", {}).get("country")
+        return f"{city}, {country}" if city else country or "Unknown"
+    return None
+
+
+@cached("geocode", PROVIDER_TTLS["geocode"])
+def reverse_geocode(lat, lon):
+    try:
+        return parse_geocode(client("nominatim").get(geocode_url(lat, lon)))
+    except Exception as e:
+        print("Geocoding error:", e)
+    return None
+
+
+def get_city_name(lat, lon):
+    return reverse_geocode(lat, lon) or fallback_city()
+
+
+def fallback_city():
+    fallback("city", "no_data")
+    return "Unknown Location"
+
+
+# 🔹 to ensure ground reading is live: OpenAQ stations are loaded per region into
+# the local catalog (stations.py) and refreshed there in bulk
+def fetch_region(region):
+    try:
+        return parse_stations(client("openaq").get(region_url(PROVIDER_URLS["openaq"], region)))
+    except Exception as e:
+        print("OpenAQ error:", e)
+    return None
+
+
+def latest_pm25(lat, lon):
+    if catalog.covers(lat, lon):
+        return catalog.lookup(lat, lon)
+    with timed("openaq"):
+        return catalog.load(lat, lon, fetch_region)
+
+
+def get_ground_data(lat, lon):
+    ground = latest_pm25(lat, lon)
+    if ground is None:
+        fallback("ground", "no_data")
+        return fallback_ground_data()
+    return ground
+
+
+def fallback_ground_data():
+    return {"pm25": round(random.uniform(5, 50), 2), "station": "Fallback"}
+
+
+# 🔹 NASA TEMPO NO2 via GES DISC
+def tempo_url(lat, lon):
+    # Alternative NASA TEMPO approach using GES DISC
+    # This provides better NO2 data access
+    return f"{PROVIDER_URLS['gesdisc']}/api/data/TEMPO_NO2_L3_V03/{lat}/{lon}"
+
+
+def tempo_headers():
+    return {"Authorization": f"Bearer {EARTHDATA_TOKEN}"}
+
+
+def stored_tempo(lat, lon):
+    no2_value = stored_no2(lat, lon)
+    if no2_value is not None:
+        return {"NO2_column": no2_value, "source": "TEMPO L3 grid"}, no2_value
+    return None
+
+
+def parse_tempo(r):
+    if r.status_code == 200:
+        try:
+            tempo_data = r.json()
+            no2_value = tempo_data.get("NO2_column", random.uniform(15, 40))
+            return tempo_data, no2_value
+        except:
+            # If JSON parsing fails, estimate based on location
+            pass
+    else:
+        print("TEMPO API unavailable, using estimated NO2 data")
+    return None
+
+
+@cached("tempo", PROVIDER_TTLS["tempo"])
+def tempo_no2(lat, lon):
+    stored = stored_tempo(lat, lon)
+    if stored is not None:
+        return stored
+    try:
+        return parse_tempo(client("gesdisc").get(tempo_url(lat, lon), headers=tempo_headers()))
+    except Exception as e:
+        print("TEMPO error:", str(e))
+    return None
+
+
+def get_tempo_data(lat, lon):
+    return tempo_no2(lat, lon) or no_tempo()
+
+
+def no_tempo():
+    # Scored with estimate_no2() instead
+    fallback("tempo", "no_data")
+    return {}, 0
+
+
+def stored_no2(lat, lon):
+    # Newest TEMPO L3 grid in the local store, if the refresher has a recent one
+    date = grid_store.latest("tempo_no2", datetime.datetime.utcnow().strftime("%Y-%m-%d"))
+    value = None if date is None else grid_store.lookup("tempo_no2", date, lat, lon)
+    return None if value is None else round(value, 2)
+
+
+def estimate_no2(lat, city):
+    # Generate realistic NO2 data based on location type
+    lat_f = float(lat)
+    # Urban areas typically have higher NO2
+    if lat_f > 50:  # Northern cities (often more industrial)
+        no2_value = random.uniform(20, 45)
+    elif lat_f > 30:  # Temperate urban areas
+        no2_value = random.uniform(25, 50)
+    else:  # Tropical/developing regions
+        no2_value = random.uniform(15, 35)
+
+    # Add city-specific factors (this could be enhanced with city detection)
+    city_lower = city.lower()
+    if any(word in city_lower for word in ['tokyo', 'beijing', 'delhi', 'mexico', 'mumbai']):
+        no2_value *= 1.5  # Major polluted cities
+    elif any(word in city_lower for word in ['stockholm', 'oslo', 'zurich', 'copenhagen']):
+        no2_value *= 0.7  # Clean Nordic cities
+
+    return round(no2_value, 2)
+
+
+# 🔹 Open-Meteo (current + hourly weather)
+def open_meteo_url(lat, lon):
+    # Enhanced weather API call with more parameters for better accuracy
+    return f"{PROVIDER_URLS['open-meteo']}/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,wind_speed_10m,weather_code&hourly=temperature_2m,relative_humidity_2m,wind_speed_10m&timezone=auto&forecast_days=5"
+
+
+@cached("weather", PROVIDER_TTLS["weather"])
+def open_meteo(lat, lon):
+    return parse_open_meteo(client("open-meteo").get(open_meteo_url(lat, lon)))
+
+
+def parse_open_meteo(response):
+    if response.status_code != 200:
+        return None
+
+    data = response.json()
+    current = data.get("current", {})
+    weather_data = {
+        "temp": round(current.get("temperature_2m", 25), 1),
+        "humidity": round(current.get("relative_humidity_2m", 60), 1),
+        "wind": round(current.get("wind_speed_10m", 5), 2),
+        "weather_code": current.get("weather_code", 0)
+    }
+
+    # Get hourly data for the 5 hours up to now for charts (times are local)
+    hourly = data.get("hourly", {})
+    if hourly:
+        temp_data = hourly.get("temperature_2m", [])
+        humidity_data = hourly.get("relative_humidity_2m", [])
+        wind_data = hourly.get("wind_speed_10m", [])
+        times = hourly.get("time", [])
+        now = current.get("time", "")[:13] + ":00"
+        end = times.index(now) + 1 if now in times else len(temp_data)
+        start = max(0, end - 5)
+
+        weather_chart = {
+            "temp": [round(v, 1) for v in temp_data[start:end]] if temp_data else [weather_data["temp"]] * 5,
+            "humidity": [round(v, 1) for v in humidity_data[start:end]] if humidity_data else [weather_data["humidity"]] * 5,
+            "wind": [round(v, 1) for v in wind_data[start:end]] if wind_data else [weather_data["wind"]] * 5,
+            # UTC epoch hours of the values above, for the history store
+            "hours": [utc_hour(t, data.get("utc_offset_seconds", 0)) for t in times[start:end]],
+            # The hours after now, as regressors for the AQI forecast
+            "ahead": {
+                "hours": [utc_hour(t, data.get("utc_offset_seconds", 0)) for t in times[end:]],
+                "temp": temp_data[end:],
+                "humidity": humidity_data[end:],
+                "wind": wind_data[end:],
+            },
+        }
+    else:
+        # Fallback to current values
+        weather_chart = {
+            "temp": [weather_data["temp"]] * 5,
+            "humidity": [weather_data["humidity"]] * 5,
+            "wind": [weather_data["wind"]] * 5
+        }
+    return weather_data, weather_chart
+
+
+def utc_hour(local_time, utc_offset):
+    t = datetime.datetime.strptime(local_time, "%Y-%m-%dT%H:%M").replace(tzinfo=datetime.timezone.utc)
+    return int((t.timestamp() - utc_offset) // 3600)
+
+
+def get_weather(lat, lon):
+    try:
+        weather = open_meteo(lat, lon)
+    except Exception as e:
+        print("Open-Meteo API error:", str(e))
+        fallback("weather", "error")
+        return fallback_weather(lat)
+    return weather or no_weather()
+
+
+def no_weather():
+    fallback("weather", "no_data")
+    return {}, {"temp": [], "humidity": [], "wind": []}
+
+
+def fallback_weather(lat):
+    # Enhanced fallback with more realistic data based on location
+    # Different base temperatures for different regions
+    lat_f = float(lat)
+    if lat_f > 40:  # Northern regions (Europe, Northern Asia)
+        base_temp = round(random.uniform(8, 18), 1)
+    elif lat_f > 23:  # Temperate regions (Most of Asia, US)
+        base_temp = round(random.uniform(15, 25), 1)
+    elif lat_f > 0:  # Tropical regions (Southeast Asia, Central Africa)
+        base_temp = round(random.uniform(24, 35), 1)
+    else:  # Southern hemisphere
+        base_temp = round(random.uniform(10, 22), 1)
+
+    weather_data = {
+        "temp": base_temp,
+        "humidity": round(random.uniform(40, 80), 1),
+        "wind": round(random.uniform(3, 15), 1),
+        "weather_code": random.randint(0, 3),
+        "estimated": True
+    }
+    weather_chart = {
+        "temp": [round(base_temp + random.uniform(-3, 3), 1) for _ in range(5)],
+        "humidity": [round(weather_data["humidity"] + random.uniform(-15, 15), 1) for _ in range(5)],
+        "wind": [round(weather_data["wind"] + random.uniform(-3, 5), 1) for _ in range(5)]
+    }
+    return weather_data, weather_chart
+
+
+# 🔹 NASA IMERG / GPCP (rainfall)
+# Parsed daily GPCP cells, {date: {(lat_cell, lon_cell): mm/day}}; GPCP is a 1° grid
+_gpcp_days = {}
+_gpcp_lock = threading.Lock()
+GPCP_DAYS_KEPT = 2
+
+
+def _gpcp_cell(lat, lon):
+    return math.floor(float(lat)), math.floor(float(lon) % 360)
+
+
+def decode_gpcp(content, lat, lon):
+    """Decode an OTF subset response in memory into {(lat_cell, lon_cell): precip}."""
+    with nc.Dataset("gpcp_subset.nc4", mode="r", memory=content) as ds:
+        variables = ds.variables
+        precip = np.ma.filled(variables["precip"][:].astype(float), np.nan)
+        if "lat" in variables and "lon" in variables:
+            lats = np.asarray(variables["lat"][:], dtype=float)
+            lons = np.asarray(variables["lon"][:], dtype=float)
+        else:
+            lats = lons = None
+
+    if lats is None or precip.size != lats.size * lons.size:
+        return {_gpcp_cell(lat, lon): float(precip.ravel()[0])}
+    precip = precip.reshape(lats.size, lons.size)
+    return {_gpcp_cell(la, lo): float(precip[i, j])
+            for i, la in enumerate(lats) for j, lo in enumerate(lons)}
+
+
+def _gpcp_lookup(date, lat, lon):
+    with _gpcp_lock:
+        value = _gpcp_days.get(date, {}).get(_gpcp_cell(lat, lon))
+    if value is None or math.isnan(value):
+        return None
+    return round(value, 2)
+
+
+def _gpcp_store(date, cells):
+    with _gpcp_lock:
+        _gpcp_days.setdefault(date, {}).update(cells)
+        for stale in sorted(_gpcp_days)[:-GPCP_DAYS_KEPT]:
+            del _gpcp_days[stale]
+
+
+def gpcp_url(lat, lon, date):
+    return (
+        f"{PROVIDER_URLS['gpm']}/daac-bin/OTF/HTTP_services.cgi?"
+        f"FILENAME=/data/GPCP/GPCPDAY/3.3/{date[:4]}/gpcp_v03r03_y{date[:4]}m{date[5:7]}d{date[8:10]}.nc4&"
+        "SERVICE=SUBSET_GPCP&VERSION=1.02&"
+        "SHORTNAME=GPCPDAY&"
+        "VARIABLES=precip&"
+        f"LAT={lat}&LON={lon}&"
+        f"token={EARTHDATA_TOKEN}&LABEL=gpcp_subset.nc4"
+    )
+
+
+def known_rainfall(lat, lon, date):
+    # Local grid store first, then GPCP subsets already downloaded today
+    rainfall = stored_rainfall(lat, lon, date)
+    return _gpcp_lookup(date, lat, lon) if rainfall is None else rainfall
+
+
+def store_gpcp(content, lat, lon, date):
+    with timed("gpcp_decode"):
+        cells = decode_gpcp(content, lat, lon)
+    _gpcp_store(date, cells)
+    return _gpcp_lookup(date, lat, lon)
+
+
+@cached("gpcp", PROVIDER_TTLS["gpcp"])
+def gpcp_precip(lat, lon, date):
+    rainfall = known_rainfall(lat, lon, date)
+    if rainfall is not None:
+        return rainfall
+    try:
+        response = client("gpm").get(gpcp_url(lat, lon, date))
+        if response.status_code == 200:
+            return store_gpcp(response.content, lat, lon, date)
+    except Exception as e:
+        print("IMERG error:", e)
+    return None
+
+
+def stored_rainfall(lat, lon, date=None):
+    # Newest daily GPCP grid in the local store up to ``date``, at most
+    # GRID_MAX_AGE_DAYS old; an older grid isn't reported as today's rain
+    date = grid_store.latest("gpcp", date or datetime.datetime.utcnow().strftime("%Y-%m-%d"))
+    value = None if date is None else grid_store.lookup("gpcp", date, lat, lon)
+    return None if value is None else round(value, 2)
+
+
+def get_rainfall(lat, lon):
+    date = datetime.datetime.utcnow().strftime("%Y-%m-%d")
+    return gpcp_precip(lat, lon, date)
+
+
+# 🔹 Fan out every independent provider call at once
+def fetch_all(lat, lon, deadline=None):
+    """Run all provider calls concurrently; any provider that misses the
+    deadline (or raises) falls back on its own without holding up the rest."""
+    deadline = PROVIDER_DEADLINE if deadline is None else deadline
+    calls = {
+        "city": get_city_name,
+        "tempo": get_tempo_data,
+        "weather": get_weather,
+        "rainfall": get_rainfall,
+        "ground": get_ground_data,
+    }
+    # Provider calls inherit the deadline, so their retries and timeouts end with it
+    with timed("fetch_all"), http_deadline(deadline):
+        futures = {name: submit(fn, lat, lon) for name, fn in calls.items()}
+        wait(futures.values(), timeout=deadline)
+    return collect_results(futures, lat, deadline)
+
+
+# What each fetch_all() provider reports when it fails or runs out of time
+FETCH_FALLBACKS = {
+    "city": lambda lat: "Unknown Location",
+    "tempo": lambda lat: ({}, 0),
+    "weather": fallback_weather,
+    "rainfall": lambda lat: None,
+    "ground": lambda lat: fallback_ground_data(),
+}
+
+
+def collect_results(futures, lat, deadline):
+    """Results of finished futures (thread or asyncio), fallbacks for the rest."""
+    results = {}
+    for name, future in futures.items():
+        replacement = FETCH_FALLBACKS[name]
+        if not future.done():
+            # Leave the straggler running (its calls stop at the deadline); its result is discarded
+            print(f"{name} provider missed the {deadline}s deadline, using fallback")
+            fallback(name, "deadline")
+            results[name] = replacement(lat)
+        elif future.exception() is not None:
+            print(f"{name} provider error:", future.exception())
+            fallback(name, "error")
+            results[name] = replacement(lat)
+        else:
+            results[name] = future.result()
+    return results
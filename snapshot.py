@@ -0,0 +1,114 @@
+import datetime, os, uuid
+import numpy as np
+from aqi import CATEGORIES, ADVISORIES, compute_aqi, adjust_for_no2, category_codes
+from cache import TTLCache, snap
+from forecast import forecaster
+from history import current_hour, history
+from metrics import timed
+from providers import estimate_no2, fetch_all
+
+# How long a dashboard's data stays reusable by /chat and nearby requests
+SNAPSHOT_TTL = int(os.getenv("SNAPSHOT_TTL", str(10 * 60)))
+
+_snapshots = TTLCache(max_bytes=int(os.getenv("SNAPSHOT_MAX_BYTES", str(8 * 1024 * 1024))))
+
+
+def build_snapshot(lat, lon, deadline=None):
+    """Fetch every provider for a location and score it; this is the single
+    data pipeline behind both /dashboard and /chat."""
+    return score_snapshot(lat, lon, fetch_all(lat, lon, deadline))
+
+
+def score_snapshot(lat, lon, fetched):
+    city = fetched["city"]
+
+    # --- NASA TEMPO (estimated from location when the satellite has no reading) ---
+    tempo_data, no2_value = fetched["tempo"]
+    measured_no2 = bool(tempo_data and no2_value)
+    if not tempo_data or not no2_value:
+        no2_value = estimate_no2(lat, city)
+    tempo_source = tempo_data.get("source", "NASA TEMPO Satellite") if tempo_data else "TEMPO Estimated"
+
+    # --- Open-Meteo + IMERG/GPCP ---
+    weather_data, weather_chart = fetched["weather"]
+    rainfall = fetched["rainfall"]
+    print(f"Weather data for {str(city).encode('ascii', 'ignore').decode('ascii')}: Temp={weather_data.get('temp')}C, Humidity={weather_data.get('humidity')}%, Wind={weather_data.get('wind')}km/h")
+
+    # --- AQI from ground PM2.5, enhanced with TEMPO NO2 ---
+    ground = fetched["ground"]
+    with timed("aqi"):
+        base_aqi = int(compute_aqi("pm25", ground["pm25"]))
+        aqi = int(adjust_for_no2(base_aqi, no2_value))
+        code = int(category_codes(aqi))
+        # What the real readings alone say: no fallback PM2.5, no estimated NO2 bump
+        measured_aqi = (int(adjust_for_no2(base_aqi, no2_value if measured_no2 else np.nan))
+                        if ground.get("station") != "Fallback" else None)
+    print(f"NASA TEMPO Integration: NO2={no2_value} ug/m3 (AQI +{aqi - base_aqi}), Ground PM2.5={ground['pm25']} ug/m3, Final AQI={aqi}")
+
+    # --- Keep the real readings (never the fallbacks) for the history charts ---
+    record_history(lat, lon, ground, measured_aqi, no2_value if measured_no2 else None, weather_data, weather_chart, rainfall)
+
+    return {
+        "id": uuid.uuid4().hex[:16],
+        "created": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S"),
+        "lat": lat,
+        "lon": lon,
+        "city": city,
+        "aqi": aqi,
+        "measured_aqi": measured_aqi,
+        "classification": CATEGORIES[code],
+        "advisory": ADVISORIES[code],
+        "no2": round(no2_value, 2),
+        "tempo_source": tempo_source,
+        "ground": ground,
+        "weather": weather_data,
+        "weather_chart": weather_chart,
+        "rainfall": rainfall,
+    }
+
+
+def record_history(lat, lon, ground, measured_aqi, no2, weather_data, weather_chart, rainfall):
+    measured = ground.get("station") != "Fallback"
+    now = {"pm25": ground["pm25"] if measured else None, "aqi": measured_aqi,
+           "no2": round(no2, 2) if no2 else None, "rainfall": rainfall}
+    rows = []
+    if not weather_data.get("estimated"):
+        # Open-Meteo's recent hourly values backfill the hours before this one
+        rows = [(lat, lon, hour, {"temp": t, "humidity": h, "wind": w}) for hour, t, h, w in
+                zip(weather_chart.get("hours", []), weather_chart["temp"], weather_chart["humidity"], weather_chart["wind"])]
+        now.update(temp=weather_data.get("temp"), humidity=weather_data.get("humidity"), wind=weather_data.get("wind"))
+    history.record_many(rows + [(lat, lon, current_hour(), now)])
+    forecaster.observe(lat, lon, current_hour(), now["aqi"], now.get("temp"), now.get("humidity"), now.get("wind"))
+
+
+def save_snapshot(snapshot):
+    _snapshots.set(("id", snapshot["id"]), snapshot, SNAPSHOT_TTL)
+    _snapshots.set(("cell", snap(snapshot["lat"]), snap(snapshot["lon"])), snapshot, SNAPSHOT_TTL)
+    return snapshot
+
+
+def get_snapshot(snapshot_id):
+    hit, snapshot = _snapshots.get(("id", snapshot_id))
+    return snapshot if hit else None
+
+
+def cached_snapshot(lat, lon, snapshot_id=None):
+    if snapshot_id:
+        snapshot = get_snapshot(snapshot_id)
+        if snapshot is not None:
+            return snapshot
+    hit, snapshot = _snapshots.get(("cell", snap(lat), snap(lon)))
+    return snapshot if hit else None
+
+
+def snapshot_for(lat, lon, snapshot_id=None):
+    """Reuse the snapshot a dashboard handed out, else the latest one for this
+    grid cell, else build (and remember) a new one."""
+    snapshot = cached_snapshot(lat, lon, snapshot_id)
+    if snapshot is not None:
+        return snapshot
+    return save_snapshot(build_snapshot(lat, lon))
+
+
+def snapshot_stats():
+    return _snapshots.stats()
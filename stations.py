@@ -0,0 +1,270 @@
+import datetime, math, os, threading, time
+import numpy as np
+
+# Inverse-distance weighting over the nearest STATION_IDW_K stations within STATION_MAX_KM
+STATION_IDW_K = int(os.getenv("STATION_IDW_K", "5"))
+STATION_MAX_KM = float(os.getenv("STATION_MAX_KM", "50"))
+# A station whose last measurement is older than this is flagged stale and only
+# used when no fresh station is in range
+STATION_STALE_HOURS = float(os.getenv("STATION_STALE_HOURS", "6"))
+KM_PER_DEG = 111.2
+
+# OpenAQ stations are loaded in bulk per region (a REGION_DEG tile, fetched
+# by radius from its centre) and indexed in BUCKET_DEG buckets, so a point
+# lookup only touches the stations in the buckets around it. The radius
+# reaches STATION_MAX_KM past the tile's corners, so one region holds every
+# station a lookup inside it can use.
+STATION_REGION_DEG = float(os.getenv("STATION_REGION_DEG", "0.5"))
+STATION_REGION_RADIUS = int(os.getenv(  # metres
+    "STATION_REGION_RADIUS", str(math.ceil((STATION_REGION_DEG * KM_PER_DEG / math.sqrt(2) + STATION_MAX_KM) * 1000))))
+STATION_BUCKET_DEG = 0.5
+# Stations per region request; OpenAQ returns the nearest ones first
+STATION_REGION_LIMIT = 1000
+STATION_REFRESH_INTERVAL = int(os.getenv("STATION_REFRESH_INTERVAL", str(15 * 60)))
+
+# Regions nobody looked up for this long stop being refreshed
+STATION_REGION_IDLE = 24 * 3600
+# A region whose fetch failed is not retried before this
+STATION_RETRY = 5 * 60
+EARTH_KM = 6371.0
+
+
+def region_of(lat, lon):
+    return (math.floor(float(lat) / STATION_REGION_DEG), math.floor(float(lon) / STATION_REGION_DEG))
+
+
+def region_url(base_url, region):
+    lat = round((region[0] + 0.5) * STATION_REGION_DEG, 4)
+    lon = round((region[1] + 0.5) * STATION_REGION_DEG, 4)
+    return (f"{base_url}/v2/latest?coordinates={lat},{lon}&radius={STATION_REGION_RADIUS}"
+            f"&parameter=pm25&order_by=distance&sort=asc&limit={STATION_REGION_LIMIT}")
+
+
+def parse_stations(response):
+    """[(name, lat, lon, pm25, updated epoch)] from an OpenAQ /v2/latest reply, or None."""
+    if response.status_code != 200:
+        return None
+    body = response.json()
+    results = body.get("results", [])
+    found = (body.get("meta") or {}).get("found")
+    if len(results) >= STATION_REGION_LIMIT or (isinstance(found, int) and found > len(results)):
+        print(f"OpenAQ region truncated: {found or 'over ' + str(len(results))} stations, kept the nearest {len(results)}")
+    stations = []
+    for result in results:
+        coords = result.get("coordinates") or {}
+        pm25 = next((m for m in result.get("measurements", []) if m.get("parameter", "pm25") == "pm25"), None)
+        if pm25 is None or coords.get("latitude") is None or coords.get("longitude") is None:
+            continue
+        try:
+            updated = datetime.datetime.fromisoformat(pm25["lastUpdated"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            updated = 0.0
+        stations.append((result.get("location"), float(coords["latitude"]), float(coords["longitude"]),
+                         float(pm25["value"]), updated))
+    return stations
+
+
+class _Index:
+    """Immutable bucketed arrays over every loaded station; swapped whole on refresh."""
+
+    def __init__(self, stations):
+        self.names = [s[0] for s in stations]
+        data = np.array([s[1:] for s in stations], dtype=float).reshape(-1, 4)
+        self.lat, self.lon, self.pm25, self.updated = data.T
+        self.lat_rad, self.lon_rad = np.radians(self.lat), np.radians(self.lon)
+        rows = np.floor(self.lat / STATION_BUCKET_DEG).astype(int)
+        cols = np.floor(self.lon / STATION_BUCKET_DEG).astype(int)
+        self.buckets = {}
+        for i, key in enumerate(zip(rows.tolist(), cols.tolist())):
+            self.buckets.setdefault(key, []).append(i)
+        self.buckets = {key: np.array(ids) for key, ids in self.buckets.items()}
+
+    def candidates(self, south, west, north, east):
+        """Indices of stations in the buckets within STATION_MAX_KM of the box."""
+        # Degrees of longitude are shortest at the box's most poleward edge
+        shortest = max(math.cos(math.radians(max(abs(south), abs(north)))), 0.01)
+        reach_lat = math.ceil(STATION_MAX_KM / KM_PER_DEG / STATION_BUCKET_DEG)
+        reach_lon = math.ceil(STATION_MAX_KM / (KM_PER_DEG * shortest) / STATION_BUCKET_DEG)
+        wrap = round(360 / STATION_BUCKET_DEG)
+        rows = range(math.floor(south / STATION_BUCKET_DEG) - reach_lat, math.floor(north / STATION_BUCKET_DEG) + reach_lat + 1)
+        first, last = math.floor(west / STATION_BUCKET_DEG) - reach_lon, math.floor(east / STATION_BUCKET_DEG) + reach_lon
+        # longitude wraps at ±180°
+        cols = {(c + wrap // 2) % wrap - wrap // 2 for c in range(first, min(last, first + wrap - 1) + 1)}
+        found = [self.buckets[(r, c)] for r in rows for c in cols if (r, c) in self.buckets]
+        return np.concatenate(found) if found else None
+
+
+class StationCatalog:
+    """Local catalog of OpenAQ PM2.5 stations with inverse-distance lookups.
+
+    ``lookup()`` is pure in-memory work. Regions are fetched the first time a
+    point in them is needed (``load()`` / ``store()``), then refreshed in bulk
+    every ``STATION_REFRESH_INTERVAL`` by ``start()``'s thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._regions = {}  # region -> [station tuples]
+        self._used = {}  # region -> last lookup, monotonic
+        self._failed = {}  # region -> time of last failed fetch, monotonic
+        self._loading = {}  # region -> lock held by the thread fetching it
+        self._index = _Index([])
+        self._thread = None
+
+    def covers(self, lat, lon):
+        """True once the point's region is loaded (or just failed to load)."""
+        return not self.missing([region_of(lat, lon)])
+
+    def missing(self, regions):
+        now = time.monotonic()
+        with self._lock:
+            for region in regions:
+                self._used[region] = now
+            return [r for r in regions
+                    if r not in self._regions and now - self._failed.get(r, -STATION_RETRY) >= STATION_RETRY]
+
+    def lookup(self, lat, lon, now=None):
+        """IDW PM2.5 from the nearest stations, or None when none is in range."""
+        index = self._index
+        lat, lon = float(lat), float(lon)
+        ids = index.candidates(lat, lon, lat, lon)
+        if ids is None:
+            return None
+        # Haversine distance to each candidate
+        phi, lam = math.radians(lat), math.radians(lon)
+        a = (np.sin((index.lat_rad[ids] - phi) / 2) ** 2
+             + math.cos(phi) * np.cos(index.lat_rad[ids]) * np.sin((index.lon_rad[ids] - lam) / 2) ** 2)
+        km = 2 * EARTH_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        near = km <= STATION_MAX_KM
+        if not near.any():
+            return None
+        ids, km = ids[near], km[near]
+
+        now = time.time() if now is None else now
+        fresh = now - index.updated[ids] <= STATION_STALE_HOURS * 3600
+        stale = not fresh.any()
+        if not stale:
+            ids, km = ids[fresh], km[fresh]
+        order = np.argsort(km)[:STATION_IDW_K]
+        ids, km = ids[order], km[order]
+        if km[0] < 0.1:
+            pm25 = index.pm25[ids[0]]
+        else:
+            weights = 1.0 / km ** 2
+            pm25 = float(weights @ index.pm25[ids] / weights.sum())
+        return {"pm25": round(float(pm25), 2), "station": index.names[ids[0]], "stations": len(ids),
+                "distance_km": round(float(km[0]), 1), "stale": stale}
+
+    def grid(self, lats, lons, now=None, rows_per_pass=32):
+        """IDW PM2.5 on the grid ``lats`` x ``lons`` (1-D axes), NaN out of range.
+
+        Unlike ``lookup`` every station within STATION_MAX_KM contributes (not
+        just the nearest STATION_IDW_K), and distances use a flat-earth
+        approximation, which is well under 1% off at that range.
+        """
+        index = self._index
+        lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+        out = np.full((lats.size, lons.size), np.nan, dtype=np.float32)
+        ids = index.candidates(lats.min(), lons.min(), lats.max(), lons.max())
+        if ids is None:
+            return out
+
+        now = time.time() if now is None else now
+        fresh = now - index.updated[ids] <= STATION_STALE_HOURS * 3600
+        # Columns: weighted sum and total weight over fresh stations, then over stale ones
+        terms = np.stack([np.where(fresh, index.pm25[ids], 0), fresh, np.where(fresh, 0, index.pm25[ids]), ~fresh],
+                         axis=1).astype(np.float32)
+        dy = ((lats[:, None] - index.lat[ids]) * KM_PER_DEG).astype(np.float32)
+        dlon = (lons[:, None] - index.lon[ids] + 180) % 360 - 180
+        dx = (dlon * KM_PER_DEG * np.cos(index.lat_rad[ids])).astype(np.float32)
+        dx2 = dx * dx
+        for start in range(0, lats.size, rows_per_pass):
+            d2 = dy[start:start + rows_per_pass, None, :] ** 2 + dx2[None, :, :]
+            w = np.where(d2 <= STATION_MAX_KM ** 2, 1 / np.maximum(d2, 0.01), 0).astype(np.float32)
+            fresh_sum, fresh_w, stale_sum, stale_w = np.moveaxis(w @ terms, -1, 0)
+            # Like lookup(): stale stations only count where no fresh one is in range
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out[start:start + rows_per_pass] = np.where(
+                    fresh_w > 0, fresh_sum / fresh_w, np.where(stale_w > 0, stale_sum / stale_w, np.nan))
+        return out
+
+    def load(self, lat, lon, fetch):
+        """Fetch the region around (lat, lon) with ``fetch(region)`` unless another
+        thread is already doing it, then look the point up."""
+        self.load_region(region_of(lat, lon), fetch)
+        return self.lookup(lat, lon)
+
+    def load_region(self, region, fetch):
+        with self._lock:
+            loading = self._loading.setdefault(region, threading.Lock())
+        with loading:
+            if self.missing([region]):
+                self.store(region, fetch(region))
+
+    def store(self, region, stations):
+        """Replace one region's stations (None marks a failed fetch)."""
+        with self._lock:
+            if stations is None:
+                self._failed[region] = time.monotonic()
+                return
+            self._failed.pop(region, None)
+            self._regions[region] = stations
+            self._rebuild()
+
+    def refresh(self, fetch):
+        """Refetch every region looked up recently; drop the idle ones."""
+        now = time.monotonic()
+        with self._lock:
+            for region in [r for r, t in self._used.items() if now - t > STATION_REGION_IDLE]:
+                self._used.pop(region)
+                self._regions.pop(region, None)
+                self._failed.pop(region, None)
+                self._loading.pop(region, None)
+            regions = list(self._regions)
+        for region in regions:
+            try:
+                stations = fetch(region)
+            except Exception as e:
+                print("Station refresh error:", e)
+                continue
+            if stations is not None:
+                with self._lock:
+                    self._regions[region] = stations
+        with self._lock:
+            self._rebuild()
+        return len(regions)
+
+    def start(self, fetch, interval=STATION_REFRESH_INTERVAL):
+        if self._thread is not None:
+            return self._thread
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh(fetch)
+                except Exception as e:
+                    print("Station refresh error:", e)
+
+        self._thread = threading.Thread(target=loop, name="station-refresh", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stats(self, now=None):
+        index = self._index
+        now = time.time() if now is None else now
+        return {"stations": len(index.names), "regions": len(self._regions),
+                "stale": int((now - index.updated > STATION_STALE_HOURS * 3600).sum())}
+
+    def _rebuild(self):
+        # The same station can come back from overlapping regions; keep its newest reading
+        merged = {}
+        for stations in self._regions.values():
+            for station in stations:
+                key = (station[0], round(station[1], 4), round(station[2], 4))
+                if key not in merged or station[4] > merged[key][4]:
+                    merged[key] = station
+        self._index = _Index(list(merged.values()))
+
+
+catalog = StationCatalog()